@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+DEFAULT_MODULES = ['utils.iri_calculator', 'utils.batch', 'utils.streaming', 'utils.plotting']
+DEFAULT_OUTPUT = 'import_time.json'
+
+# Modules that should only load when a caller needs them
+HEAVY_MODULES = ['matplotlib', 'scipy.signal', 'scipy.integrate', 'plotly']
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+# Cold import time of a module in a fresh interpreter, best of `repeat`, and the heavy modules it pulled in
+def measure_import(module, repeat=5):
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                   capture_output=True, text=True, cwd=REPO_ROOT, check=True)
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or probe['seconds'] < best['seconds']:
+            best = probe
+
+    return {'module': module, 'seconds': best['seconds'], 'heavy_modules_loaded': best['loaded']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.import_time',
+        description='Measure cold import time of the calculator modules in fresh interpreters.')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module, the best time is kept')
+    parser.add_argument('--max-seconds', type=float, help='exit with status 1 if any import is slower')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help=f'results JSON (default: {DEFAULT_OUTPUT})')
+    args = parser.parse_args(argv)
+
+    results = [measure_import(module, args.repeat) for module in args.modules]
+    with open(args.output, 'w') as fh:
+        json.dump({'python': sys.version.split()[0], 'results': results}, fh, indent=2)
+
+    for result in results:
+        loaded = ', '.join(result['heavy_modules_loaded']) or '-'
+        print(f"{result['module']:<24} {result['seconds'] * 1000:8.1f} ms   heavy modules: {loaded}")
+
+    if args.max_seconds is not None and any(result['seconds'] > args.max_seconds for result in results):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from benchmarks.synthetic import write_survey_csv
+from utils.iri_calculator import IRICalculator
+
+
+DEFAULT_DURATIONS = [1, 10, 60, 180]        # minutes of driving
+DEFAULT_OUTPUT = 'bench_results.json'
+
+
+# Stages timed one by one, each a function of the state built by the previous ones
+# (name, function(calculator, state) -> value stored in state under the name)
+def _stages(segment_length):
+    return [
+        ('parse', lambda calc, s: calc.load_data(s['csv'], fast=True, engine='auto')),
+        ('preprocess', lambda calc, s: calc.preprocess_data(s['parse'])[0]),
+        ('resample_time', lambda calc, s: calc.resample_time(s['preprocess'])),
+        ('filter', lambda calc, s: calc.filter_accelerometer_data(s['preprocess'])[0]),
+        ('gps_speed', lambda calc, s: calc.calculate_speed_from_gps(s['preprocess'])),
+        ('orientation', lambda calc, s: calc.extract_vertical_acceleration(s['filter'])),
+        ('orientation_quaternion', lambda calc, s: _orientation(calc, 'quaternion').extract_vertical_acceleration(s['filter'])),
+        ('distance', lambda calc, s: calc.calculate_distance(s['filter']['time'].values, calc.resolve_speed(s['filter']))),
+        ('segmentation', lambda calc, s: calc._create_segments(s['distance'], s['orientation'], calc.resolve_speed(s['filter']), segment_length)),
+        ('iri', lambda calc, s: calc.calculate_segment_iri_batch(s['orientation'], calc.resolve_speed(s['filter']),
+                                                                s['segmentation'].start_index, s['segmentation'].end_index)),
+        ('rms_pipeline', lambda calc, s: calc.calculate_iri_rms_method(s['preprocess'], segment_length)),
+        ('quarter_car_pipeline', lambda calc, s: calc.calculate_iri_rms_method(s['preprocess'], segment_length, method='quarter_car')),
+    ]
+
+
+# Copy of the calculator using another orientation correction (see utils/orientation.py)
+def _orientation(calculator, method):
+    calculator = calculator.with_timer()
+    calculator.orientation_method = method
+    return calculator
+
+
+# Best wall time of `repeat` calls, and the peak traced memory of one more call (None without memory)
+def measure(fn, repeat=1, memory=True):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result, best, peak
+
+
+# Time every stage for one synthetic survey of duration_min minutes, one record per stage
+def benchmark_survey(duration_min, rate=100, roughness=3.0, segment_length=100, repeat=1, memory=True, workdir=None):
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        csv_path = os.path.join(tmp, f'survey_{duration_min}min.csv')
+        rows = write_survey_csv(csv_path, duration=duration_min * 60, rate=rate, roughness=roughness)
+        csv_bytes = os.path.getsize(csv_path)
+
+        calculator = IRICalculator()
+        state = {'csv': csv_path}
+        records = []
+
+        for name, stage in _stages(segment_length):
+            state[name], seconds, peak = measure(lambda: stage(calculator, state), repeat, memory)
+            records.append({
+                'duration_min': duration_min,
+                'rows': rows,
+                'csv_bytes': csv_bytes,
+                'stage': name,
+                'seconds': seconds,
+                'rows_per_second': rows / seconds if seconds > 0 else None,
+                'peak_bytes': peak
+            })
+
+    return records
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scipy': scipy.__version__
+    }
+
+
+# Runs every stage once on a short survey without keeping the times, so the modules the calculator
+# imports on first use (scipy.signal, pyarrow...) are loaded before timing instead of in the first survey's stages
+def warm_up(rate=100, segment_length=100, workdir=None):
+    benchmark_survey(0.25, rate, segment_length=segment_length, memory=False, workdir=workdir)
+
+
+def run(durations=DEFAULT_DURATIONS, rate=100, roughness=3.0, segment_length=100, repeat=1, memory=True, workdir=None):
+    warm_up(rate, segment_length, workdir)
+    records = []
+    for duration_min in durations:
+        records += benchmark_survey(duration_min, rate, roughness, segment_length, repeat, memory, workdir)
+        print(f"{duration_min} min done", file=sys.stderr)
+
+    return {
+        'environment': environment(),
+        'config': {'durations_min': list(durations), 'rate': rate, 'roughness': roughness,
+                   'segment_length': segment_length, 'repeat': repeat},
+        'results': records
+    }
+
+
+# Stage times of two result files side by side, ratio > 1 means the current run is slower
+def compare(baseline, current):
+    base = pd.DataFrame(baseline['results']).set_index(['duration_min', 'stage'])['seconds']
+    curr = pd.DataFrame(current['results']).set_index(['duration_min', 'stage'])['seconds']
+    table = pd.DataFrame({'baseline_s': base, 'current_s': curr}).dropna()
+    table['ratio'] = table['current_s'] / table['baseline_s']
+    return table.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run_benchmarks',
+        description='Time every IRICalculator stage on synthetic Physics Toolbox surveys.')
+    parser.add_argument('-d', '--durations', type=float, nargs='+', default=DEFAULT_DURATIONS, help='survey lengths in minutes')
+    parser.add_argument('-r', '--rate', type=float, default=100, help='sensor sampling rate in Hz (default: 100)')
+    parser.add_argument('--roughness', type=float, default=3.0, help='road roughness, about the IRI in m/km (default: 3)')
+    parser.add_argument('-l', '--segment-length', type=float, default=100, help='segment length in meters (default: 100)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage, the best time is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory pass')
+    parser.add_argument('--workdir', help='directory for the temporary CSV files')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help=f'results JSON (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args.durations, args.rate, args.roughness, args.segment_length, args.repeat, not args.no_memory, args.workdir)
+    with open(args.output, 'w') as fh:
+        json.dump(results, fh, indent=2)
+
+    table = pd.DataFrame(results['results'])
+    table['peak_mb'] = table['peak_bytes'].astype(float) / 1e6
+    print(table[['duration_min', 'rows', 'stage', 'seconds', 'peak_mb']].to_string(index=False))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        print(compare(baseline, results).to_string(index=False))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+START_TIME = '2024-05-12T10:00:00'
+EARTH_RADIUS = 6371000          # meters, same as utils/geodesy.py
+
+
+# Synthetic drive shaped like a Physics Toolbox Sensor Suite export
+# duration in seconds, rate in Hz. roughness scales the road profile (about the IRI in m/km), speed
+# is the mean driving speed (m/s). GPS is updated at gps_rate and held in between like the app does.
+# Returns a DataFrame with ISO 'time' strings, ax/ay/az, wx/wy/wz and latitude/longitude/speed/altitude.
+def synthetic_survey(duration=60, rate=100, roughness=3.0, speed=15.0, gyro=True, gps=True,
+                     gps_rate=1.0, seed=0, start=START_TIME):
+    rng = np.random.default_rng(seed)
+    n = int(duration * rate)
+
+    # Sample times with a little jitter, the phone does not sample exactly on time
+    t = np.arange(n) / rate + rng.normal(0, 0.05 / rate, n)
+    t.sort()
+
+    # Speed varying slowly around the mean, and the distance it gives
+    v = speed * (1 + 0.15 * np.sin(2 * np.pi * t / 120)) + rng.normal(0, 0.1, n)
+    v = np.clip(v, 0.5, None)
+    distance = np.concatenate([[0.0], np.cumsum(0.5 * (v[1:] + v[:-1]) * np.diff(t))])
+
+    # Road profile: white-noise slope on a 0.25 m grid, its elevation sampled at the vehicle position
+    # and differentiated twice in time to give the vertical acceleration
+    grid = np.arange(0, distance[-1] + 1, 0.25)
+    slope = rng.normal(0, roughness * 1e-3, len(grid))
+    elevation = np.cumsum(slope - slope.mean()) * 0.25
+    z = np.interp(distance, grid, elevation)
+    vertical = np.gradient(np.gradient(z, t), t)
+
+    data = {
+        'time': np.datetime_as_string(np.datetime64(start) + (t * 1e6).astype('timedelta64[us]'), unit='ms'),
+        'ax': rng.normal(0, 0.3, n),
+        'ay': rng.normal(0, 0.3, n),
+        'az': vertical + rng.normal(0, 0.2, n)
+    }
+
+    if gyro:
+        data['wx'] = rng.normal(0, 0.01, n)
+        data['wy'] = rng.normal(0, 0.01, n)
+        data['wz'] = rng.normal(0, 0.01, n)
+
+    if gps:
+        # Straight-ish track heading north-east, GPS fixes held between updates
+        heading = np.radians(45) + 0.2 * np.sin(distance / 2000)
+        north = np.cumsum(np.cos(heading) * np.diff(distance, prepend=0.0))
+        east = np.cumsum(np.sin(heading) * np.diff(distance, prepend=0.0))
+        fix = np.searchsorted(np.arange(0, t[-1] + 1, 1 / gps_rate), t, side='right') - 1
+        held = np.searchsorted(fix, fix, side='left')
+
+        data['latitude'] = (14.6 + np.degrees(north / EARTH_RADIUS))[held]
+        data['longitude'] = (121.0 + np.degrees(east / (EARTH_RADIUS * np.cos(np.radians(14.6)))))[held]
+        data['speed'] = v[held]
+        data['altitude'] = (20 + 0.001 * distance)[held]
+
+    return pd.DataFrame(data)
+
+
+# Write a synthetic survey CSV, returns its number of rows
+def write_survey_csv(path, **kwargs):
+    df = synthetic_survey(**kwargs)
+    df.to_csv(path, index=False, float_format='%.6f')
+    return len(df)
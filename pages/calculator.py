@@ -1,11 +1,11 @@
+import os
 import streamlit as st
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.express as px
-from utils.iri_calculator import IRICalculator
+from utils.downsample import downsample_trace
+from utils.iri_calculator import IRI_METHODS, IRICalculator, classify_iri, iri_statistics
+from utils.page_assets import page_css
+from utils.result_cache import ResultCache
+from utils.signal_store import store_result
 
 # Set page config
 st.set_page_config(
@@ -13,110 +13,8 @@ st.set_page_config(
     initial_sidebar_state = "expanded"
 )
 
-# Custom CSS for template
-st.markdown("""
-<style>
-
-    h1{
-        text-align: center;
-    }
-
-    .info-box{
-        background-color : #F8F9FA;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 5px solid #2E4057;
-        margin: 1rem 0;
-    }
-
-    .section-header{
-        font-size: 1.5rem;
-        font-weight: bold;
-        color: #2E4057;
-        margin-top: 32px;
-        margin-bottom: 1rem;
-        border-bottom: 2px solid #2E4057;
-        padding-bottom: 0.5rem;
-        text-align: left;
-    }
-
-    .metric-container{
-        background-color: #E8F4FD;
-        padding: 1rem;
-        border-radius: 10px;
-        text-align: center;
-        margin: 0.5rem 0;
-    }
-
-    .stButton > button[kind="primary"]{
-        background-color: #2E4057 !important;
-        color: white;
-        border: none;
-        border-radius: 5 px;
-        font-weight: bold;
-        padding: 0.5rem 1rem;
-    }
-
-    st.Button > button[kind="primary"]{
-        background-color: #1a2633;
-        color:white;
-    }
-
-    /*  Overlay background */
-    [data-testid="stSidebar"] {
-        background-image: url("https://github.com/Jacob-DelosAngeles/IRI-system/blob/master/images/sidebar_background.jpg?raw=true");
-        background-position: center;
-        background-repeat: no-repeat;
-    }
-
-    [data-testid="stSidebar"] .css-1wvake5,
-    [data-testid="stSidebar"] .css-16idsys,
-    [data-testid="stSidebar"] .css-10trblm,
-    [data-testid="stSidebar"] .css-1v0mbdj,
-    [data-testid="stSidebar"] .css-1v3fvcr,
-    [data-testid="stSidebar"] h1, 
-    [data-testid="stSidebar"] h2, 
-    [data-testid="stSidebar"] h3, 
-    [data-testid="stSidebar"] p, 
-    [data-testid="stSidebar"] span {
-        color: white !important;
-        font-weight: bold;
-        font-size: 1.1rem;
-    }
-
-    [data-testid="stSidebar"] .st-emotion-cache-1rtdyuf {
-        margin: 0px auto;
-    }
-
-    [data-testid="stSidebar"] .st-emotion-cache-2s0is {
-        margin: 0px auto;
-    }
-
-    [data-testid="stSidebar"] svg {
-    fill: white !important;
-    }
-
-    [data-testid="stNavSectionHeader"] {
-        color: white;
-        font-size: 28px;
-        font-weight: bold;
-        text-shadow: 
-            -1px -1px 0 #000, 
-            1px -1px 0 #000, 
-            -1px 1px 0 #000, 
-            1px 1px 0 #000;
-    }
-
-    [data-testid="stSidebarNavLink"] {
-        margin-top: 20px;
-        margin-bottom: 100px;
-        background-color: black;
-        border: 2px solid wheat;
-    }
-
-</style>
-
-""", unsafe_allow_html = True)
+# Custom CSS for template, read once per process (see utils/page_assets.py)
+st.markdown(page_css('calculator'), unsafe_allow_html = True)
 
 st.markdown('<h1 class="main-header">📱 IRI Calculator</h1>',
 unsafe_allow_html = True)
@@ -176,39 +74,91 @@ uploaded_file = st.file_uploader(
 )
 
 
+# Display names of the IRICalculator pipeline stages
+STAGE_LABELS = {
+    'parse': 'CSV parsing',
+    'preprocess': 'Data cleaning',
+    'resample_time': 'Time resampling',
+    'filter': 'Signal filtering',
+    'orientation': 'Orientation correction',
+    'distance': 'Speed and distance',
+    'resample': 'Distance resampling',
+    'profile': 'Road profile',
+    'segmentation': 'Segmentation',
+    'iri': 'IRI calculation'
+}
+
+# Signals kept in the session once, as float32, and memory-mapped to temporary files when
+# IRI_SIGNAL_MEMMAP=1 so idle sessions can be paged out (see utils/signal_store.py)
+SESSION_SIGNAL_DTYPE = np.float32
+SESSION_SIGNAL_MEMMAP = os.environ.get('IRI_SIGNAL_MEMMAP') == '1'
+
+# Low-pass cutoff of the accelerometer filter (Hz)
+CUTOFF_FREQ = 10
+
+
+# ----- Cached resources and stage results -------
+# Streamlit re-runs this whole script on every widget change. The calculator, the upload's key and
+# the stage results below are kept between reruns, so a rerun that only changes a widget (threshold,
+# map toggle) does no numerical work. Arguments starting with '_' are not hashed, file_key stands in for them.
+# Cached functions must not draw on the page, so their stages run on a calculator without a progress bar.
+
+# One calculator for the process, its filter designs are memoized in utils/filters.py
+# Pipeline runs use get_calculator().with_timer() so each session times and reports its own run
+@st.cache_resource
+def get_calculator():
+    return IRICalculator()
+
+
+# sha256 of the upload, hashed once per uploaded file rather than on every rerun
+def upload_key(uploaded_file):
+    keys = st.session_state.setdefault('upload_keys', {})
+    if uploaded_file.file_id not in keys:
+        keys.clear()
+        keys[uploaded_file.file_id] = ResultCache.key(uploaded_file.getvalue(), {})
+    return keys[uploaded_file.file_id]
+
+
+# Parsed and cleaned survey, (df_processed, duration) or None
+# resample_timestamps is the _calculator setting, passed so results with and without it are cached apart
+@st.cache_data(max_entries = 2, show_spinner = False)
+def preprocess_upload(file_key, resample_timestamps, _uploaded_file, _calculator):
+    df = _calculator.load_data(_uploaded_file, fast=True, engine='auto')
+    return _calculator.preprocess_data(df) if df is not None else None
+
+
+# Filtered survey, (df_filtered, sampling_rate)
+@st.cache_data(max_entries = 2, show_spinner = False)
+def filter_upload(file_key, cutoff_freq, resample_timestamps, _df_processed, _calculator):
+    return _calculator.filter_accelerometer_data(_df_processed, cutoff_freq)
+
+
+# Signal plot traces cut to a few thousand points keeping the peaks, per survey and time window
+# survey_key = (file_key, timestamps resampled)
+@st.cache_data(max_entries = 8, show_spinner = False)
+def signal_traces(survey_key, time_window, _df_processed, _df_filtered, _vertical_accel):
+    traces = {axis: downsample_trace(_df_processed['time'].values, _df_processed[axis].values, x_range = time_window)
+              for axis in ('ax', 'ay', 'az')}
+    traces['vertical_accel'] = downsample_trace(_df_filtered['time'].values, _vertical_accel, x_range = time_window)
+    return traces
+
+
+# Map points of a result, result_key = (file_key, timestamps resampled, IRI method, segment length)
+@st.cache_data(max_entries = 8, show_spinner = False)
+def map_points(result_key, average, _df, _iri_values, _segments):
+    return get_calculator().segment_map_points(_df, _iri_values, _segments, average = average)
+
+
 # ----- Functions for Map Visualization -------
 
-def plot_iri_map(df, iri_values, segments):
-    latitudes = []
-    longitudes = []
-    qualities = []
-
-    for iri, seg in zip(iri_values, segments):
-        idx = seg['center_index']
-
-        if 0 <= idx < len(df):
-            lat = df.iloc[idx]['latitude']
-            lon = df.iloc[idx]['longitude']
-            latitudes.append(lat)
-            longitudes.append(lon)
-
-            if iri <= 3:
-                qualities.append("Good")
-            elif iri <= 5:
-                qualities.append("Fair")
-            elif iri <=7:
-                qualities.append("Poor")
-            else:
-                qualities.append("Bad")
-        else:
-            continue
-    
-    map_df = pd.DataFrame({
-        'Latitude': latitudes,
-        'Longitude': longitudes,
-        'IRI': iri_values[:len(latitudes)],
-        'Quality': qualities
-    })
+def plot_iri_map(result_key, df, iri_values, segments, average_coordinates = False):
+    import plotly.express as px
+
+    map_df = map_points(result_key, average_coordinates, df, iri_values, segments)
+
+    if map_df.empty:
+        st.info("🗺️ No GPS coordinates in this file, the IRI map is not available")
+        return
 
     color_map = {
         "Good": "#28a745",
@@ -280,63 +230,112 @@ if uploaded_file is not None:
     6. ✅ IRI calculation and quality assessment
     """)
     
+    # IRI method - switching it on a calculated file only re-runs the profile and segment stages
+    iri_method = st.selectbox(
+        "IRI Method",
+        options = list(IRI_METHODS),
+        format_func = IRI_METHODS.get,
+        help = "RMS model: empirical relation to RMS vertical acceleration. Quarter-car: reconstructs the road profile and simulates the IRI reference vehicle at 80 km/h."
+    )
+
+    # Uniform time grid before filtering, set on each run's calculator copy rather than the shared calculator
+    resample_timestamps = st.checkbox(
+        "Resample timestamps",
+        help = "Puts jittery or interrupted sensor timestamps on a uniform time grid before filtering. Segments over a gap in the recording get no IRI."
+    )
+
+    def session_calculator(progress_callback = None):
+        calculator = get_calculator().with_timer(progress_callback)
+        calculator.resample_timestamps = resample_timestamps
+        return calculator
+
     # Calculate Button and algorithm
-    if st.button("🧮 Caculate IRI", type="primary", use_container_width = True) or st.session_state.recalculate:
+    # Results are cached on disk by file content and parameters, so re-uploads of a survey are instant
+    file_key = upload_key(uploaded_file)
+    previous_result = st.session_state.calculation_result
+    can_reuse = (previous_result is not None and previous_result.get('file_key') == file_key
+                 and previous_result.get('resample_timestamps', False) == resample_timestamps)
+    method_changed = can_reuse and previous_result['stages'].get('iri_method', 'rms') != iri_method
+
+    if st.button("🧮 Caculate IRI", type="primary", use_container_width = True) or (st.session_state.recalculate and not can_reuse):
         with st.spinner("Processing accelerometer data and calculating IRI..."):
-            import time
-            time.sleep(2) # Simulate processing time
+            progress_bar = st.progress(0.0, text="Starting IRI calculation...")
+
+            def show_progress(stage, fraction):
+                progress_bar.progress(fraction, text=f"Finished {STAGE_LABELS.get(stage, stage)}")
 
             # Include the Program for calculation
-            iri_calc = IRICalculator()
-            df = pd.read_csv(uploaded_file)
-            df_processed, duration = iri_calc.preprocess_data(df)
-            df_filtered, _ = iri_calc.filter_accelerometer_data(df_processed)
-            vertical_accel = iri_calc.extract_vertical_acceleration(df_filtered)
-
-            if df_processed is not None:
-                
-                # For recomputation of segment length and threshold value
-                segment_length = st.session_state.segment_length
-                threshold_value = st.session_state.threshold_value
-
-                # For IRI Calculation
-                iri_values, segments, sampling_rate, speed = iri_calc.calculate_iri_rms_method(df_processed, segment_length)
-
-                mean_iri = np.mean(iri_values)
-
-                # For Total Distance
-                segment_centers = [s['distance_start'] + s['length']/2 for s in segments]
-
-                st.session_state.calculation_result ={
-                    'iri_values': iri_values,
-                    'segments': segments,
-                    'segment_centers': segment_centers,
-                    'mean_iri': mean_iri,
-                    'sampling_rate': sampling_rate,
-                    'speed': speed,
-                    'duration': duration,
-                    'df': df,
-                    'df_filtered': df_filtered,
-                    'vertical_accel': vertical_accel,
-                    'df_processed': df_processed
-                }
+            iri_calc = session_calculator(show_progress)
+            segment_length = st.session_state.segment_length
+            result_cache = ResultCache()
+            cache_key = ResultCache.key(uploaded_file.getvalue(), iri_calc.cache_params(segment_length, CUTOFF_FREQ, iri_method))
+            cached_result = result_cache.load(cache_key)
+
+            if cached_result is not None:
+                cached_result['file_key'] = file_key
+                cached_result['resample_timestamps'] = resample_timestamps
+                cached_result['segment_length'] = segment_length
+                cached_result['timings'] = None
+                progress_bar.progress(1.0, text="Loaded cached results")
+                st.session_state.calculation_result = store_result(cached_result, SESSION_SIGNAL_DTYPE, SESSION_SIGNAL_MEMMAP)
                 st.session_state.recalculate = False
             else:
-                st.error("❌ Data preprocessing failed")
+                # Parsing, cleaning and filtering are reused from an earlier run of the same file when
+                # possible, their timings only count when they actually ran
+                stage_calc = session_calculator()
+                preprocessed = preprocess_upload(file_key, resample_timestamps, uploaded_file, stage_calc)
+
+                if preprocessed is not None:
+                    df_processed, duration = preprocessed
+
+                    # For IRI Calculation - every stage runs once, the filtered data and vertical
+                    # acceleration are kept for the plots and for recalculation
+                    filtered = filter_upload(file_key, CUTOFF_FREQ, resample_timestamps, df_processed, stage_calc)
+                    iri_calc.timer.merge(stage_calc.timer)
+                    stages = iri_calc.run_pipeline(df_processed, segment_length, CUTOFF_FREQ, iri_method, filtered = filtered)
+
+                    calculation_result = {
+                        'file_key': file_key,
+                        'resample_timestamps': resample_timestamps,
+                        'segment_length': segment_length,
+                        'stages': stages,
+                        'duration': duration,
+                        'df_processed': df_processed,
+                        'timings': iri_calc.timer.to_frame()
+                    }
+                    result_cache.save(cache_key, calculation_result)
+
+                    # Full-precision copies are dropped once the signals are in the session store
+                    st.session_state.calculation_result = store_result(calculation_result, SESSION_SIGNAL_DTYPE, SESSION_SIGNAL_MEMMAP)
+                    st.session_state.recalculate = False
+                else:
+                    st.error("❌ Data preprocessing failed")
+
+    elif st.session_state.recalculate or method_changed:
+        # Only the segment length or IRI method changed - reuse the filtered vertical acceleration and distance
+        with st.spinner("Recalculating IRI segments..."):
+            iri_calc = session_calculator()
+            previous_result['stages'] = iri_calc.recompute_segments(previous_result['stages'], st.session_state.segment_length, iri_method)
+            previous_result['segment_length'] = st.session_state.segment_length
+            previous_result['timings'] = iri_calc.timer.to_frame()
+            st.session_state.recalculate = False
 
     if st.session_state.calculation_result:
         result = st.session_state.calculation_result
-        iri_values = result['iri_values']
-        segments = result['segments']
-        segment_centers = result['segment_centers']
-        mean_iri = result['mean_iri']
-        sampling_rate =  result['sampling_rate']
-        speed = result['speed']
+        stages = result['stages']
+        iri_values = stages['iri_values']
+        segments = stages['segments']
+        segment_centers = segments.segment_centers
+        iri_stats = iri_statistics(iri_values)
+        mean_iri = iri_stats['mean']
+        sampling_rate =  stages['sampling_rate']
+        speed = stages['speed_estimate']
         duration = result['duration']
-        df = result['df']
-        df_filtered = result['df_filtered']
-        vertical_accel = result['vertical_accel']
+        df_filtered = stages['df_filtered']
+        vertical_accel = stages['vertical_accel']
         df_processed = result['df_processed']
+        result_key = (result['file_key'], result.get('resample_timestamps', False), stages.get('iri_method', 'rms'),
+                      result.get('segment_length', st.session_state.segment_length))
 
         total_distance = segment_centers[-1] + (segments[-1]['length']/2)
 
@@ -349,21 +348,24 @@ if uploaded_file is not None:
         with col1:
             st.metric("🛣️ IRI Value", f"{mean_iri:.2f}", help="International Roughness Index")
         with col2:
-            if mean_iri <= 3:
-                classification = 'Good'
-            elif mean_iri <= 5:
-                classification = 'Fair'
-            elif mean_iri <= 7:
-                classification = 'Poor'
-            else:
-                classification = 'Bad'
+            classification = classify_iri(mean_iri)
             st.metric("⭐ Road Quality", f"{classification}", help="Pavement quality assessment")
         with col3:
-            st.metric("📊 Standard Deviation", f"{np.std(iri_values):.2f}", help="IRI spread")
+            st.metric("📊 Standard Deviation", f"{iri_stats['std']:.2f}", help="IRI spread")
         
         # Quality Assessment
         def get_sample_quality_rating(iri_value):
-            if iri_value <= 3:
+            if np.isnan(iri_value):
+                return{
+                    'rating': 'No data',
+                    'description': 'No segment has an IRI value',
+                    'color': '#6c757d',
+                    'interpretation': """Every segment spans a gap in the recording's timestamps,
+                    so no IRI could be calculated.""",
+                    'recommendations': """Record the survey again without interruptions in
+                    the sensor data."""
+                }
+            elif iri_value <= 3:
                 return{
                     'rating': 'Good',
                     'description': 'Acceptable pavement condition',
@@ -437,16 +439,33 @@ if uploaded_file is not None:
         
         with col2:
             st.markdown("**Data Quality Metrics:**")
-            st.write(f"- Min IRI: {np.min(iri_values):.2f} m/km ")
-            st.write(f"- Max IRI: {np.max(iri_values):.2f}  m/km")
-            st.write(f"- Standard Deviation: {np.std(iri_values):.2f} m/km")
+            st.write(f"- Min IRI: {iri_stats['min']:.2f} m/km ")
+            st.write(f"- Max IRI: {iri_stats['max']:.2f}  m/km")
+            st.write(f"- Standard Deviation: {iri_stats['std']:.2f} m/km")
             st.write(f"- Road IRI: {mean_iri:.2f} m/km")
 
 
+        # Stage Timing Breakdown
+        timings = result.get('timings')
+        if timings is not None and len(timings):
+            with st.expander(f"⏱️ Processing time: {timings['seconds'].sum():.2f} s"):
+                timing_table = timings.assign(
+                    stage = timings['stage'].map(lambda stage: STAGE_LABELS.get(stage, stage)),
+                    share = (timings['share']*100).round(1)
+                ).rename(columns = {'stage': 'Stage', 'seconds': 'Time (s)', 'share': 'Share (%)'})
+                st.dataframe(timing_table, hide_index = True, use_container_width = True)
+
         # Plotting Results
         st.markdown('<div class="section-header">📈 IRI Data Visualization </div>', unsafe_allow_html = True)
 
-        # Create Plotly Subplots
+        # Time window for the signal plots, a narrower window is redrawn at full resolution
+        time_start, time_end = float(df_processed['time'].iloc[0]), float(df_processed['time'].iloc[-1])
+        time_window = st.slider("🔍 Time Window (s)", min_value = time_start, max_value = time_end, value = (time_start, time_end))
+
+        # Create Plotly Subplots - plotly is only imported once there are results to show
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
         fig = make_subplots(
             rows =3, cols = 1,
             shared_xaxes = False,
@@ -458,13 +477,15 @@ if uploaded_file is not None:
             )
         )
 
-        # Plot Raw Accelerometer Data
-        fig.add_trace(go.Scattergl(x=df['time'], y=df['ax'], mode='lines', name='X-axis', line=dict(color='blue')), row=1, col=1)
-        fig.add_trace(go.Scattergl(x=df['time'], y=df['ay'], mode='lines', name='Y-axis', line=dict(color='orange')), row=1, col=1)
-        fig.add_trace(go.Scattergl(x=df['time'], y=df['az'], mode='lines', name='Z-axis', line=dict(color='green')), row=1, col=1)
+        # Plot Raw Accelerometer Data - each trace is cut to a few thousand points keeping the peaks
+        traces = signal_traces(result_key[:2], time_window, df_processed, df_filtered, vertical_accel)
+        for axis, name, color in [('ax', 'X-axis', 'blue'), ('ay', 'Y-axis', 'orange'), ('az', 'Z-axis', 'green')]:
+            trace_x, trace_y = traces[axis]
+            fig.add_trace(go.Scattergl(x=trace_x, y=trace_y, mode='lines', name=name, line=dict(color=color)), row=1, col=1)
 
         # Plot Filtered Vertical Acceleration
-        fig.add_trace(go.Scattergl(x=df_filtered['time'], y=vertical_accel, mode='lines', name='Vertical Accel', line=dict(color = '#FFBF00')), row=2, col=1)
+        trace_x, trace_y = traces['vertical_accel']
+        fig.add_trace(go.Scattergl(x=trace_x, y=trace_y, mode='lines', name='Vertical Accel', line=dict(color = '#FFBF00')), row=2, col=1)
 
 
         # Plot IRI Values
@@ -531,7 +552,8 @@ if uploaded_file is not None:
         # st.session_state.iri_values = iri_values
         # st.session_state.segments = segments
 
-        plot_iri_map(df_processed, iri_values, segments)
+        average_coordinates = st.toggle("Average GPS coordinates over each segment", value = False)
+        plot_iri_map(result_key, df_processed, iri_values, segments, average_coordinates)
 
 
         # Addition of Advanced Settings
@@ -542,11 +564,12 @@ if uploaded_file is not None:
         new_segment_length = st.number_input("Segment Length (m)", value=st.session_state.segment_length, step=10, min_value = 100)
         new_threshold_value = st.number_input("IRI Threshold (m/km)", value=st.session_state.threshold_value, step=0.1, min_value=0.0)
 
-        # Recalculation button
+        # Recalculation button - a threshold change only redraws, a segment length change re-segments
         if st.button("🔁 Recalculate with Advanced Settings",  type="primary", use_container_width = True):
+            if new_segment_length != st.session_state.segment_length:
+                st.session_state.recalculate = True
             st.session_state.segment_length = new_segment_length
             st.session_state.threshold_value = new_threshold_value
-            st.session_state.recalculate = True
             st.rerun()
 
 else:
@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.page_assets import page_css
 
 # Set page config
 st.set_page_config(
@@ -6,102 +7,8 @@ st.set_page_config(
     initial_sidebar_state = "expanded"
 )
 
-# Custom CSS for template
-st.markdown("""
-<style>
-
-    h1{
-        text-align: center;
-    }
-
-    .info-box{
-        background-color : #F8F9FA;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 5px solid #2E4057;
-        margin: 1rem 0;
-    }
-
-    .section-header{
-        font-size: 1.5rem;
-        font-weight: bold;
-        color: #2E4057;
-        margin-top: 32px;
-        margin-bottom: 1rem;
-        border-bottom: 2px solid #2E4057;
-        padding-bottom: 0.5rem;
-        text-align: left;
-    }
-
-    .metric-container{
-        background-color: #E8F4FD;
-        padding: 1rem;
-        border-radius: 10px;
-        text-align: center
-        margin: 0.5rem 0;
-        text-align: center;
-    }
-    
-    .highlight-text{
-        background-color: #FFF3CD;
-        padding: 0.5rem;
-        border-radius: 5px;
-        border-left: 3px solid #FFC107;
-    }
-
-    [data-testid="stSidebar"] {
-        background-image: url("https://github.com/Jacob-DelosAngeles/IRI-system/blob/master/images/sidebar_background.jpg?raw=true");
-        background-position: center;
-        background-repeat: no-repeat;
-    }
-
-    [data-testid="stSidebar"] .css-1wvake5,
-    [data-testid="stSidebar"] .css-16idsys,
-    [data-testid="stSidebar"] .css-10trblm,
-    [data-testid="stSidebar"] .css-1v0mbdj,
-    [data-testid="stSidebar"] .css-1v3fvcr,
-    [data-testid="stSidebar"] h1, 
-    [data-testid="stSidebar"] h2, 
-    [data-testid="stSidebar"] h3, 
-    [data-testid="stSidebar"] p, 
-    [data-testid="stSidebar"] span {
-        color: white !important;
-        font-weight: bold;
-        font-size: 1.1rem;
-    }
-
-    [data-testid="stSidebar"] .st-emotion-cache-1rtdyuf {
-        margin: 0px auto;
-    }
-
-    [data-testid="stSidebar"] .st-emotion-cache-2s0is {
-        margin: 0px auto;
-    }
-    
-
-    [data-testid="stSidebar"] svg {
-    fill: white !important;
-    }
-
-    [data-testid="stNavSectionHeader"] {
-        color: white;
-        font-size: 28px;
-        font-weight: bold;
-        text-shadow: 
-            -1px -1px 0 #000, 
-            1px -1px 0 #000, 
-            -1px 1px 0 #000, 
-            1px 1px 0 #000;
-    }
-
-    [data-testid="stSidebarNavLink"] {
-        margin-top: 20px;
-        margin-bottom: 100px;
-        background-color: black;
-        border: 2px solid wheat;
-    }
-</style>
-""", unsafe_allow_html = True)
+# Custom CSS for template, read once per process (see utils/page_assets.py)
+st.markdown(page_css('overview'), unsafe_allow_html = True)
 
 # Adding the Title
 st.markdown('<h1 class="main-header">International Roughness Index</h1>', unsafe_allow_html=True)
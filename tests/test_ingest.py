@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_survey_csv
+from utils.iri_calculator import IRICalculator
+
+
+# A recording cut off inside the timestamp of its last row, e.g. '...\n2024-'
+@pytest.fixture
+def cut_survey(tmp_path):
+    path = tmp_path / 'survey.csv'
+    rows = write_survey_csv(path, duration=20)
+    text = path.read_text().rstrip('\n')
+    last_row = text.rsplit('\n', 1)[1]
+    path.write_text(text[:-len(last_row)] + last_row[:5] + '\n')
+    return path, rows - 1
+
+
+@pytest.mark.parametrize('fast, engine', [(False, None), (True, None), (True, 'auto')])
+def test_load_survey_cut_mid_timestamp(cut_survey, fast, engine):
+    path, complete_rows = cut_survey
+    calculator = IRICalculator()
+
+    df = calculator.load_data(str(path), fast=fast, engine=engine)
+    assert df is not None
+
+    df_processed, duration = calculator.preprocess_data(df)
+    assert len(df_processed) == complete_rows
+    assert np.isfinite(df_processed['time']).all()
+    assert duration == pytest.approx(20, abs=0.1)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_survey
+from utils.iri_calculator import IRICalculator
+from utils.streaming import IncrementalIRI
+
+
+# Online segment IRIs against the whole-file calculation: under 2% median and 6% per segment
+@pytest.mark.parametrize('block_size', [100, 5000])
+def test_incremental_iri_matches_batch(block_size):
+    df = synthetic_survey(duration=300, roughness=4.0, seed=1)
+
+    calculator = IRICalculator()
+    df_processed, _ = calculator.preprocess_data(df)
+    batch, _, _, _ = calculator.calculate_iri_rms_method(df_processed, 100)
+
+    online = IncrementalIRI(IRICalculator(), segment_length=100)
+    for start in range(0, len(df), block_size):
+        online.push(df.iloc[start:start + block_size])
+    incremental = online.results()['iri_value'].values
+
+    # The last, partial segment is only finished by the whole-file calculation
+    assert len(batch) - 1 <= len(incremental) <= len(batch)
+    deviation = np.abs(incremental / batch[:len(incremental)] - 1)
+    assert np.median(deviation) < 0.02
+    assert deviation.max() < 0.06
@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+
+from utils.ingest import has_pyarrow
+from utils.result_cache import PROFILE_ARRAYS, pack_result, unpack_result
+
+
+ARCHIVE_VERSION = 1
+ARCHIVE_FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+META_FILE = 'meta.json'
+
+# Tables of an archive: per-sample signals, per-segment results and the distance grid (quarter-car only)
+TABLES = ('signals', 'segments', 'grid')
+
+
+# Archive of a processed survey and its IRI results in a columnar binary format
+# A directory holding signals.<ext> (time, raw and filtered axes, GPS, vertical acceleration, speed and
+# distance), segments.<ext> (one row per segment), grid.<ext> when the quarter-car method ran, and
+# meta.json. Loading it skips CSV parsing, preprocessing and filtering. Needs pyarrow.
+# format='feather' is written uncompressed as one record batch per table, so with
+# import_result(memory_map=True) the signal and segment arrays are views of the mapped files.
+def export_result(result, directory, format='parquet'):
+    if format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unsupported archive format: {format}")
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    arrays = pack_result(result)
+    meta = json.loads(str(arrays.pop('meta')))
+
+    columns = {table: {} for table in TABLES}
+    for name, values in arrays.items():
+        table, column = _table_column(name)
+        columns[table][column] = np.asarray(values)
+
+    os.makedirs(directory, exist_ok=True)
+    for table, table_columns in columns.items():
+        path = os.path.join(directory, table + ARCHIVE_FORMATS[format])
+        if not table_columns:
+            if os.path.exists(path):
+                os.remove(path)         # left over from an earlier export to the same directory
+            continue
+
+        arrow_table = pa.table(table_columns)
+        if format == 'feather':
+            feather.write_feather(arrow_table, path, compression='uncompressed',
+                                  chunksize=max(arrow_table.num_rows, 1))
+        else:
+            pq.write_table(arrow_table, path)
+
+    meta.update(archive_version=ARCHIVE_VERSION, format=format)
+    with open(os.path.join(directory, META_FILE), 'w') as fh:
+        json.dump(meta, fh, indent=2)
+
+    return directory
+
+
+# Result written by export_result, in the same shape as the calculator page result
+# (stages, duration, df_processed). memory_map=True maps the files instead of reading them.
+def import_result(directory, memory_map=False):
+    _require_pyarrow()
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    with open(os.path.join(directory, META_FILE)) as fh:
+        meta = json.load(fh)
+    extension = ARCHIVE_FORMATS[meta['format']]
+
+    data = {'meta': np.array(json.dumps(meta))}
+    for table in TABLES:
+        path = os.path.join(directory, table + extension)
+        if not os.path.exists(path):
+            continue
+
+        if meta['format'] == 'feather':
+            arrow_table = feather.read_table(path, memory_map=memory_map)
+        else:
+            arrow_table = pq.read_table(path, memory_map=memory_map)
+
+        for column in arrow_table.column_names:
+            data[_array_name(table, column, meta)] = arrow_table.column(column).to_numpy()
+
+    return unpack_result(data)
+
+
+# Where a pack_result array goes in the archive: (table, column name)
+# The filtered columns end in '_filtered', the resolved speed is renamed so it does not clash with GPS speed
+def _table_column(name):
+    for prefix in ('processed__', 'filtered__'):
+        if name.startswith(prefix):
+            return 'signals', name[len(prefix):]
+    for prefix in ('grid__', 'profile__'):
+        if name.startswith(prefix):
+            return 'grid', name[len(prefix):]
+    if name.startswith('segment_'):
+        return 'segments', name[len('segment_'):]
+    if name == 'speed':
+        return 'signals', 'vehicle_speed'
+    return 'signals', name
+
+
+# pack_result name of an archive column, the inverse of _table_column
+def _array_name(table, column, meta):
+    if table == 'segments':
+        return 'segment_' + column
+    if table == 'grid':
+        return ('profile__' if column in PROFILE_ARRAYS else 'grid__') + column
+    if column in meta['filtered_cols']:
+        return 'filtered__' + column
+    if column in meta['processed_cols']:
+        return 'processed__' + column
+    if column == 'vehicle_speed':
+        return 'speed'
+    return column
+
+
+def _require_pyarrow():
+    if not has_pyarrow():
+        raise ImportError("Parquet/Feather archives need pyarrow, install it with 'pip install pyarrow'")
@@ -0,0 +1,150 @@
+import argparse
+import glob
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import numpy as np
+
+from utils.instrumentation import export_metrics
+from utils.iri_calculator import IRI_METHODS, IRICalculator
+
+
+DEFAULT_OUTPUT = 'iri_batch_results.csv'
+
+
+# Survey CSVs for a directory (every *.csv in it), a glob pattern or a list of paths
+def find_survey_files(target):
+    if not isinstance(target, str):
+        return sorted(target)
+    if os.path.isdir(target):
+        target = os.path.join(target, '*.csv')
+    return sorted(glob.glob(target))
+
+
+# Load, preprocess and compute IRI for one file, run inside a worker process
+# Never raises: errors are returned in the summary so one bad file does not stop the batch
+# The summary also holds the stage metrics of the file under 'metrics' (see StageTimer.to_records)
+# resample_timestamps puts the samples on a uniform time grid before filtering (see IRICalculator.resample_time)
+def process_file(path, segment_length=100, cutoff_freq=10, engine=None, method='rms', resample_timestamps=False):
+    summary = {'file': path, 'status': 'ok', 'error': None, 'rows': 0, 'segments': 0,
+               'duration': np.nan, 'distance': np.nan, 'mean_iri': np.nan}
+    calculator = IRICalculator()
+    calculator.resample_timestamps = resample_timestamps
+    try:
+        df = calculator.load_data(path, fast=True, engine=engine, raise_errors=True)
+
+        preprocessed = calculator.preprocess_data(df)
+        if preprocessed is None:
+            raise ValueError("missing required columns (time, ax, ay, az)")
+        df_processed, duration = preprocessed
+
+        stages = calculator.run_pipeline(df_processed, segment_length, cutoff_freq, method)
+
+        table = stages['segments'].to_frame(stages['iri_values'])
+        table.insert(0, 'file', path)
+
+        summary.update(rows=len(df_processed), segments=len(table), duration=duration,
+                       distance=stages['distance'][-1],
+                       mean_iri=table['iri_value'].mean() if len(table) else np.nan)
+        return summary, table
+
+    except Exception as e:
+        summary.update(status='error', error=f"{type(e).__name__}: {e}")
+        return summary, None
+
+    finally:
+        summary['metrics'] = calculator.metrics.to_records()
+
+
+# Compute IRI for many survey files across a process pool
+# Returns (results, summary): one consolidated row per segment of every file, and one row per file
+# with its status and error message. workers=None uses every core, workers=1 runs in this process.
+# metrics: local JSON lines file the stage metrics of every file are appended to (see utils/instrumentation.py)
+def run_batch(target, segment_length=100, cutoff_freq=10, workers=None, output=None, engine=None, method='rms',
+              metrics=None, resample_timestamps=False):
+    paths = find_survey_files(target)
+    summaries = []
+    tables = []
+
+    def collect(summary, table):
+        summaries.append(summary)
+        if table is not None:
+            tables.append(table)
+
+    if workers == 1:
+        for path in paths:
+            collect(*process_file(path, segment_length, cutoff_freq, engine, method, resample_timestamps))
+    elif paths:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(process_file, path, segment_length, cutoff_freq, engine, method, resample_timestamps): path
+                       for path in paths}
+            for future in as_completed(futures):
+                try:
+                    collect(*future.result())
+                except Exception as e:
+                    # The worker itself died (e.g. out of memory)
+                    collect({'file': futures[future], 'status': 'error', 'error': f"{type(e).__name__}: {e}"}, None)
+
+    summary = pd.DataFrame(summaries, columns=['file', 'status', 'error', 'rows', 'segments', 'duration', 'distance', 'mean_iri'])
+    summary = summary.sort_values('file').reset_index(drop=True)
+
+    if tables:
+        results = pd.concat(tables, ignore_index=True).sort_values(['file', 'segment_id']).reset_index(drop=True)
+    else:
+        results = pd.DataFrame(columns=['file', 'segment_id', 'distance_start', 'distance_end', 'segment_length',
+                                        'iri_value', 'mean_speed', 'rms_accel'])
+
+    if output:
+        results.to_csv(output, index=False)
+
+    if metrics:
+        for row in sorted(summaries, key=lambda row: row['file']):
+            export_metrics(metrics, row.get('metrics', []), file=row['file'], status=row['status'],
+                           segment_length=segment_length, iri_method=method, resample_timestamps=resample_timestamps)
+
+    return results, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.batch',
+        description='Compute IRI for a directory or glob of Physics Toolbox Sensor Suite CSV files.')
+    parser.add_argument('target', help='directory of CSV files or a glob pattern (quote it)')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help=f'consolidated results CSV (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--summary', help='also write the per-file summary to this CSV')
+    parser.add_argument('-l', '--segment-length', type=float, default=100, help='segment length in meters (default: 100)')
+    parser.add_argument('--cutoff', type=float, default=10, help='low-pass cutoff frequency in Hz (default: 10)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('-m', '--method', choices=list(IRI_METHODS), default='rms', help='IRI method (default: rms)')
+    parser.add_argument('--engine', choices=['c', 'pyarrow', 'auto'], default='auto', help='CSV parser engine')
+    parser.add_argument('--resample-timestamps', action='store_true',
+                        help='put jittery or interrupted timestamps on a uniform time grid before filtering, '
+                             'segments over a recording gap get no IRI')
+    parser.add_argument('--metrics', help='append per-stage metrics of every file to this JSON lines file')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the progress of every file')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(processName)s %(name)s %(levelname)s: %(message)s')
+
+    results, summary = run_batch(args.target, args.segment_length, args.cutoff, args.workers, args.output,
+                                 engine=None if args.engine == 'c' else args.engine, method=args.method,
+                                 metrics=args.metrics, resample_timestamps=args.resample_timestamps)
+
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+
+    failed = summary[summary['status'] != 'ok']
+    print(f"Processed {len(summary)} files: {len(summary) - len(failed)} ok, {len(failed)} failed")
+    print(f"{len(results)} segments written to {args.output}")
+    for _, row in failed.iterrows():
+        print(f"  FAILED {row['file']}: {row['error']}")
+
+    return 1 if len(summary) == 0 or len(failed) == len(summary) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
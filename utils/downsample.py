@@ -0,0 +1,79 @@
+import numpy as np
+
+
+DEFAULT_MAX_POINTS = 4000       # points per trace sent to the browser / drawn
+
+
+# Indices of the minimum and maximum sample of each of n_buckets equal-width buckets,
+# plus the first and last sample. Keeps every peak (e.g. a pothole) whatever the zoom level.
+def minmax_indices(y, n_buckets):
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * n_buckets + 2 or n_buckets < 1:
+        return np.arange(n)
+
+    size = n // n_buckets
+    full = n_buckets * size
+    buckets = y[:full].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+
+    picks = [offsets + np.argmin(buckets, axis=1), offsets + np.argmax(buckets, axis=1), [0, n - 1]]
+    if full < n:
+        tail = y[full:]
+        picks.append([full + np.argmin(tail), full + np.argmax(tail)])
+
+    return np.unique(np.concatenate(picks).astype(np.intp))
+
+
+# Indices chosen by Largest-Triangle-Three-Buckets: keeps the visual shape of a line with few points
+# Loops over buckets (max_points of them), each bucket itself is handled with array operations
+def lttb_indices(x, y, max_points):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.intp)
+    selected = np.empty(max_points, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+
+        # Twice the triangle area between the previous point, each candidate and the next bucket's mean
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+
+# Downsample one trace to at most about max_points points
+# method='minmax' keeps peaks, method='lttb' keeps the line shape. x_range=(x0, x1) first cuts the
+# trace to that window (x must be sorted), so a zoomed view gets full resolution within the budget.
+def downsample_trace(x, y, max_points=DEFAULT_MAX_POINTS, method='minmax', x_range=None):
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    if x_range is not None:
+        lo, hi = np.searchsorted(x, x_range[0], side='left'), np.searchsorted(x, x_range[1], side='right')
+        x, y = x[lo:hi], y[lo:hi]
+
+    if max_points is None or len(y) <= max_points:
+        return x, y
+
+    if method == 'lttb':
+        idx = lttb_indices(x, y, max_points)
+    elif method == 'minmax':
+        idx = minmax_indices(y, max_points // 2 - 1)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    return x[idx], y[idx]
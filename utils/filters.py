@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+FILTER_ORDER = 4            # 4th-order Butterworth low-pass
+HIGHPASS_ORDER = 2          # 2nd-order Butterworth high-pass, removes integration drift
+FILTER_CACHE_SIZE = 32      # designs kept before the least recently used one is dropped
+
+# scipy.signal is imported on first use, it is slow to import and not every caller filters
+
+
+# Butterworth low-pass design, memoized on (order, cutoff, sampling rate)
+# The cutoff is lowered to 0.9 x Nyquist when it is too high for the sampling rate.
+# output='sos' (second-order sections) is numerically stable, output='ba' gives (b, a).
+# Callers get their own copy of the coefficients, a few dozen floats, so the cache cannot be modified.
+def lowpass_design(sampling_rate, cutoff_freq=10, order=FILTER_ORDER, output='sos'):
+    if output not in ('sos', 'ba'):
+        raise ValueError(f"Unsupported filter output: {output}")
+
+    return _copy_design(_butter_design(int(order), float(cutoff_freq), float(sampling_rate), 'low', output))
+
+
+# Butterworth high-pass design, memoized the same way as lowpass_design
+# sampling_rate and cutoff_freq may be in cycles per meter for signals sampled over distance
+def highpass_design(sampling_rate, cutoff_freq, order=HIGHPASS_ORDER, output='sos'):
+    if output not in ('sos', 'ba'):
+        raise ValueError(f"Unsupported filter output: {output}")
+
+    return _copy_design(_butter_design(int(order), float(cutoff_freq), float(sampling_rate), 'high', output))
+
+
+def _copy_design(design):
+    if isinstance(design, tuple):
+        return design[0].copy(), design[1].copy()
+    return design.copy()
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def _butter_design(order, cutoff_freq, sampling_rate, btype, output):
+    from scipy import signal
+    nyquist = sampling_rate / 2                    # max frequency to capture (half of sample rate)
+    if cutoff_freq >= nyquist:                     # lower  cutoff_freq if too high
+        cutoff_freq = nyquist * 0.9
+
+    return signal.butter(order, cutoff_freq / nyquist, btype=btype, output=output)
+
+
+def clear_filter_cache():
+    _butter_design.cache_clear()
+
+
+def filter_cache_info():
+    return _butter_design.cache_info()
+
+
+# Zero-phase filter of several channels in one call, one column per channel
+def zero_phase_filter(sos, data):
+    from scipy import signal
+    return signal.sosfiltfilt(sos, np.asarray(data, dtype=float), axis=0)
+
+
+# Padding sosfiltfilt adds at each end of the signal
+def sosfiltfilt_padlen(sos):
+    ntaps = 2 * len(sos) + 1
+    ntaps -= min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+    return 3 * ntaps
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+EARTH_RADIUS = 6371000      # Earth radius in meters
+
+
+# Haversine distance between two sets of points (degrees in, meters out), element-wise
+def haversine_distance(lat1, lon1, lat2, lon2):
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lat2, lon2 = np.radians(lat2), np.radians(lon2)
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2*np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+    return EARTH_RADIUS * c
+
+
+# Distance between consecutive GPS points, first point is 0
+def point_distances(latitude, longitude):
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+
+    distances = np.zeros(len(latitude))
+    if len(latitude) > 1:
+        distances[1:] = haversine_distance(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:])
+
+    return distances
+
+
+# Cumulative distance travelled (chainage) along the GPS track
+def cumulative_chainage(latitude, longitude):
+    return np.cumsum(point_distances(latitude, longitude))
+
+
+# Speed between consecutive GPS points over the whole track in one pass
+# Where dt <= 0 (repeated or out of order timestamps) the previous speed is carried forward
+# initial_speed is the speed at the first point (0 for a fresh track, the last speed when continuing one)
+def speed_from_gps(latitude, longitude, time, initial_speed=0):
+    time = np.asarray(time, dtype=float)
+    n = len(time)
+    if n == 0:
+        return np.array([])
+
+    distances = point_distances(latitude, longitude)
+    dt = np.zeros(n)
+    dt[1:] = np.diff(time)
+
+    valid = dt > 0
+    valid[0] = True                            # initial position has the initial speed
+
+    speeds = np.zeros(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(distances, dt, out=speeds, where=valid)
+    speeds[0] = initial_speed
+
+    # Carry forward: every invalid sample takes the speed of the last valid one
+    last_valid = np.where(valid, np.arange(n), 0)
+    np.maximum.accumulate(last_valid, out=last_valid)
+
+    return speeds[last_valid]
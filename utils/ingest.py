@@ -0,0 +1,139 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+import numpy as np
+
+
+# Columns of a Physics Toolbox Sensor Suite export that the calculator uses
+# Linear Accelerometer: ax, ay, az (m/s2), Gyroscope: wx, wy, wz (rad/s)
+# GPS: latitude, longitude, speed (m/s), altitude
+TIME_COLUMN = 'time'
+NUMERIC_COLUMNS = ['ax', 'ay', 'az', 'wx', 'wy', 'wz', 'latitude', 'longitude', 'speed', 'altitude']
+PHYSICS_TOOLBOX_COLUMNS = [TIME_COLUMN] + NUMERIC_COLUMNS
+
+# Timestamp layouts tried in order before falling back to pandas' own inference
+TIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y-%m-%d %H:%M:%S:%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%H:%M:%S:%f',
+    '%H:%M:%S.%f',
+]
+
+
+# Is the pyarrow CSV engine available
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# Read a Physics Toolbox CSV with a known schema
+# Only the needed columns are read, numerics come in as explicit floats and time is parsed
+# with a detected (and cached) format. engine='pyarrow' uses the multithreaded Arrow reader.
+def read_physics_toolbox_csv(source, engine=None, dtype=np.float64):
+    if engine == 'auto':
+        engine = 'pyarrow' if has_pyarrow() else None
+
+    header = pd.read_csv(source, nrows=0).columns
+    _rewind(source)
+    usecols = [col for col in header if col in PHYSICS_TOOLBOX_COLUMNS]
+    dtypes = {col: dtype for col in usecols if col != TIME_COLUMN}
+
+    read_kwargs = {'usecols': usecols, 'dtype': dtypes}
+    if engine is not None:
+        read_kwargs['engine'] = engine
+
+    try:
+        df = pd.read_csv(source, **read_kwargs)
+    except ValueError:
+        # Non-numeric cells somewhere (e.g. blank GPS fields written as text) or a short row (e.g. a
+        # recording cut off mid-line, which the Arrow reader rejects), read loosely with the C parser,
+        # which pads short rows with NaN, and coerce
+        _rewind(source)
+        read_kwargs.pop('dtype')
+        read_kwargs.pop('engine', None)
+        df = pd.read_csv(source, **read_kwargs)
+        df[list(dtypes)] = coerce_numeric(df, list(dtypes)).astype(dtype)
+
+    if TIME_COLUMN in df.columns:
+        df[TIME_COLUMN] = parse_timestamps(df[TIME_COLUMN])
+
+    return df
+
+
+# Convert columns to numbers, unconvertable values become NaN
+# Columns that are already floating point are passed through without a per-column pass
+def coerce_numeric(df, columns):
+    frame = df[columns]
+    if all(pd.api.types.is_float_dtype(dt) for dt in frame.dtypes):
+        return frame
+    return frame.apply(pd.to_numeric, errors='coerce')
+
+
+# Parse a timestamp column to datetime64, using a cached format when one fits
+def parse_timestamps(series):
+    is_text = pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+    if not is_text:
+        return pd.to_datetime(series)
+
+    sample = series.dropna()
+    if len(sample) == 0:
+        return pd.to_datetime(series)
+
+    fmt = _time_format_for(_shape(str(sample.iloc[0])))
+    if fmt is not None:
+        parsed = pd.to_datetime(series, format=fmt, errors='coerce')
+        # Any value the format could not read means the file is not uniform, let pandas infer
+        if parsed.isna().sum() == series.isna().sum():
+            return parsed
+
+    # Unreadable values (e.g. a last row cut off inside its timestamp) become NaT and are dropped with
+    # the other incomplete rows
+    return pd.to_datetime(series, errors='coerce')
+
+
+# Parsed timestamps as seconds since the first sample
+def timestamps_to_seconds(series):
+    seconds = timestamps_to_epoch_seconds(series)
+    return seconds - seconds[0]
+
+
+# Parsed timestamps as Unix seconds, NaN where a timestamp could not be read
+def timestamps_to_epoch_seconds(series):
+    times = parse_timestamps(series)
+    if getattr(times.dt, 'tz', None) is not None:
+        times = times.dt.tz_convert(None)
+    seconds = times.values.astype('datetime64[ns]').astype('int64') / 1e9
+    seconds[times.isna().values] = np.nan
+    return seconds
+
+
+# Timestamp layout with every digit replaced, identical for all rows of a file
+def _shape(value):
+    return re.sub(r'\d', '0', value.strip())
+
+
+# Format matching a timestamp shape, cached so each layout is only worked out once
+@lru_cache(maxsize=64)
+def _time_format_for(shape):
+    example = shape.replace('0', '1')
+    for fmt in TIME_FORMATS:
+        try:
+            pd.to_datetime(pd.Series([example]), format=fmt)
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
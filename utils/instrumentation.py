@@ -0,0 +1,164 @@
+import functools
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+
+# Pipeline stages in the order they run for one upload
+STAGES = ['parse', 'preprocess', 'resample_time', 'filter', 'orientation', 'distance', 'resample', 'profile', 'segmentation', 'iri']
+
+
+# Wall time and metrics per pipeline stage, with an optional progress callback
+# callback(stage, fraction) is called when a stage finishes, fraction being how far through
+# STAGES the pipeline is (0-1). Time spent in a stage is added up over repeated calls.
+# Stages also record metrics (rows in and out, dropped NaN rows, sampling rate...) with record(),
+# and the process peak memory when they finish, plus their own peak of traced memory while
+# tracemalloc is tracing. to_records() gives them per stage for everything timed so far, export()
+# only the stages run since the previous export.
+class StageTimer:
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.timings = {}
+        self.metrics = {}
+        self._exported = {}             # stage timings at the last export()
+
+    def reset(self):
+        self.timings = {}
+        self.metrics = {}
+        self._exported = {}
+
+    @contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+            self.record(name, peak_rss_bytes=peak_rss_bytes(),
+                        peak_traced_bytes=tracemalloc.get_traced_memory()[1] if tracing else None)
+
+        self._report(name)
+
+    # Metrics of a stage, None values are left out so a stage run in several calls keeps what each knows
+    def record(self, name, **values):
+        self.metrics.setdefault(name, {}).update((key, value) for key, value in values.items() if value is not None)
+
+    # Adds the stage times and metrics of another timer, e.g. of stages run on a copy of the calculator
+    def merge(self, other):
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+            self.record(name, **other.metrics.get(name, {}))
+            self._report(name)
+
+    def _report(self, name):
+        if self.callback is not None:
+            position = STAGES.index(name) + 1 if name in STAGES else len(self.timings)
+            self.callback(name, min(1.0, position / len(STAGES)))
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    # Stages that ran, in pipeline order
+    def stage_names(self):
+        names = [name for name in STAGES if name in self.timings]
+        return names + [name for name in self.timings if name not in STAGES]
+
+    # One row per stage that ran, in pipeline order
+    def to_frame(self):
+        names = self.stage_names()
+        seconds = [self.timings[name] for name in names]
+        total = sum(seconds) or 1.0
+
+        return pd.DataFrame({
+            'stage': names,
+            'seconds': seconds,
+            'share': [value / total for value in seconds]
+        })
+
+    # One dict per stage that ran, in pipeline order: its wall time and recorded metrics
+    def to_records(self):
+        return [dict(stage=name, seconds=self.timings[name], **self.metrics.get(name, {})) for name in self.stage_names()]
+
+    # to_records() of the stages that ran since the last export() or reset(), with the time spent since then
+    def records_since_export(self):
+        records = []
+        for record in self.to_records():
+            seconds = record['seconds'] - self._exported.get(record['stage'], 0.0)
+            if seconds > 0:
+                records.append(dict(record, seconds=seconds))
+        return records
+
+    # Appends the stages run since the previous export() or reset() as one line of a local metrics file
+    # (see export_metrics). A line covers one run: parse and preprocess only appear in the line of the
+    # run they were done for, not again when the same data is run with other settings.
+    def export(self, path, **context):
+        record = export_metrics(path, self.records_since_export(), **context)
+        self._exported = dict(self.timings)
+        return record
+
+
+# Method decorator timing the call as a stage on the instance's `timer`, if it has one
+# Rows in (first argument) and out (result, or its first item) are recorded for DataFrames and arrays
+def timed_stage(name):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            timer = getattr(self, 'timer', None)
+            if timer is None:
+                return method(self, *args, **kwargs)
+            with timer.stage(name):
+                result = method(self, *args, **kwargs)
+            timer.record(name, rows_in=row_count(args[0]) if args else None, rows_out=row_count(result))
+            return result
+        return wrapper
+    return decorator
+
+
+# Rows of a DataFrame or array, or of the first item of a tuple of them, None for anything else
+def row_count(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    shape = getattr(value, 'shape', None)
+    return int(shape[0]) if shape else None
+
+
+# Appends the stage metrics of one run (StageTimer.to_records) as one JSON line to a local file,
+# context (e.g. file=...) is stored with them. Returns the written record.
+def export_metrics(path, records, **context):
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **context,
+        'total_seconds': sum(stage['seconds'] for stage in records),
+        'stages': records
+    }
+    with open(path, 'a') as fh:
+        fh.write(json.dumps(record, default=_json_default) + '\n')
+    return record
+
+
+# Peak resident memory of this process so far in bytes, None where the resource module is missing (Windows)
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# numpy scalars in recorded metrics
+def _json_default(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
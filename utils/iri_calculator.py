@@ -1,36 +1,150 @@
+import copy
+import logging
 import pandas as pd
 import numpy as np
-from scipy import signal
-from scipy.integrate import cumulative_trapezoid
-import matplotlib.pyplot as plt
-from math import radians, cos, sin, sqrt, atan2
-import warnings
-warnings.filterwarnings('ignore')
+from utils.downsample import DEFAULT_MAX_POINTS
+from utils.filters import lowpass_design, zero_phase_filter
+from utils.geodesy import speed_from_gps
+from utils.instrumentation import StageTimer, timed_stage
+from utils.ingest import read_physics_toolbox_csv, coerce_numeric, timestamps_to_seconds
+from utils.orientation import ORIENTATION_METHODS, OrientationCorrector
+from utils.quarter_car import reconstruct_profile, quarter_car_response, segment_iri
+from utils.resample import GRID_SPACING, resample_to_distance, resample_to_time, segments_with_gaps
+from utils.segmentation import SegmentTable, segment_means
 
 
+logger = logging.getLogger(__name__)
 
 
+# Bumped whenever a change alters computed results, so cached results from older versions are not reused
+CALCULATOR_VERSION = '1.2'
+
+# Road quality classes: IRI <= 3 Good, <= 5 Fair, <= 7 Poor, above that Bad
+QUALITY_THRESHOLDS = [3, 5, 7]
+QUALITY_LABELS = np.array(['Good', 'Fair', 'Poor', 'Bad'])
+# Class of a segment without an IRI (NaN, e.g. one spanning a timestamp gap)
+NO_DATA_LABEL = 'No data'
+
+# IRI methods: the empirical RMS acceleration model, or the quarter-car reference model run over a
+# profile reconstructed from the vertical acceleration (see utils/quarter_car.py)
+IRI_METHODS = {
+    'rms': 'RMS acceleration model',
+    'quarter_car': 'Quarter-car (Golden Car) simulation'
+}
+
+
+# Quality class for one or many IRI values
+def classify_iri(iri_values):
+    iri_values = np.asarray(iri_values, dtype=float)
+    classes = np.where(np.isnan(iri_values), NO_DATA_LABEL,
+                       QUALITY_LABELS[np.digitize(iri_values, QUALITY_THRESHOLDS, right=True)])
+    return str(classes) if np.ndim(classes) == 0 else classes
+
+
+# Mean, standard deviation, min and max of segment IRI values, segments without an IRI (NaN) left out
+# All NaN when no segment has one
+def iri_statistics(iri_values):
+    iri_values = np.asarray(iri_values, dtype=float)
+    valid = iri_values[~np.isnan(iri_values)]
+    if len(valid) == 0:
+        return {'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan}
+    return {'mean': valid.mean(), 'std': valid.std(), 'min': valid.min(), 'max': valid.max()}
+
+
+# Timestamp gap mask of a preprocessed or filtered DataFrame, None when it was not resampled
+def gap_mask(df):
+    return df['gap'].values.astype(bool) if 'gap' in df.columns else None
+
 
 class IRICalculator:
 
     # Initialization
-    def __init__(self):
+    # progress_callback(stage, fraction) is called as each pipeline stage finishes (see utils/instrumentation.py)
+    # metrics_file: local JSON lines file a line of stage metrics is appended to after every run_pipeline and
+    # recompute_segments call, covering the stages run since the previous line (see StageTimer.export)
+    def __init__(self, progress_callback=None, metrics_file=None):
         self.gravity = 9.81 
         self.iri_segments = []
+        self.timer = StageTimer(progress_callback)
+        self.metrics_file = metrics_file
+
+        # RMS model: IRI = K * (RMS_accel)^n / speed^m
+        # Values below are approximate coefficients and needs calibration
+        self.calibration_k = 80.59   # Calibration constant
+        self.accel_exponent = 1      # Acceleration exponent
+        self.speed_exponent = 1      # Speed Exponent
+
+        # Orientation correction (see utils/orientation.py): 'small_angle' or 'quaternion', and the time
+        # constant (s) of the gravity complementary filter, None to trust the gyroscope alone
+        self.orientation_method = 'small_angle'
+        self.gravity_time_constant = None
+
+        # Put irregular timestamps on a uniform time grid before filtering (see resample_time), intervals
+        # longer than max_gap seconds are gaps (None: GAP_FACTOR sampling intervals, utils/resample.py)
+        self.resample_timestamps = False
+        self.max_gap = None
+
+    # Copy sharing this calculator's configuration with its own StageTimer, so one calculator can be
+    # shared by several callers (e.g. Streamlit sessions) while each times and reports its own run
+    def with_timer(self, progress_callback=None):
+        calculator = copy.copy(self)
+        calculator.iri_segments = []
+        calculator.timer = StageTimer(progress_callback)
+        return calculator
+
+    # Wall time, rows in and out, dropped NaN rows, sampling rate and peak memory of every stage run so
+    # far (see StageTimer in utils/instrumentation.py), e.g. metrics.to_records() or metrics.export(path)
+    @property
+    def metrics(self):
+        return self.timer
+
+    # Everything that changes the computed results, used to key cached results (see utils/result_cache.py)
+    def cache_params(self, segment_length=100, cutoff_freq=10, method='rms'):
+        return {
+            'version': CALCULATOR_VERSION,
+            'segment_length': segment_length,
+            'cutoff_freq': cutoff_freq,
+            'iri_method': method,
+            'calibration_k': self.calibration_k,
+            'accel_exponent': self.accel_exponent,
+            'speed_exponent': self.speed_exponent,
+            'orientation_method': self.orientation_method,
+            'gravity_time_constant': self.gravity_time_constant,
+            'resample_timestamps': self.resample_timestamps,
+            'max_gap': self.max_gap
+        }
 
     # Loads the Data
-    def load_data(self, csv_file):
+    # fast=True reads a Physics Toolbox export with its known schema (see utils/ingest.py):
+    # only the needed columns, float dtypes and a cached timestamp format
+    # Read errors are logged and give None, or are raised with raise_errors=True (e.g. to report them per file)
+    @timed_stage('parse')
+    def load_data(self, csv_file, fast=False, engine=None, raise_errors=False):
         try:
-            df = pd.read_csv(csv_file)
-            print(f"Loaded data has {len(df)} rows")
-            print(f"Features: {list(df.columns)}")
+            if fast:
+                df = read_physics_toolbox_csv(csv_file, engine=engine)
+            else:
+                df = pd.read_csv(csv_file)
+            logger.info("Loaded data has %d rows", len(df))
+            logger.debug("Features: %s", list(df.columns))
             return df
         except Exception as e:
-            print(f"Error in loading data: {e}")
+            if raise_errors:
+                raise
+            logger.error("Error in loading data: %s", e)
             return None
 
-    # Processing and Cleaning the Data
+    # Processing and Cleaning the Data, then the uniform time grid when resample_timestamps is set
     def preprocess_data(self, df):
+        preprocessed = self.clean_data(df)
+        if preprocessed is None or not self.resample_timestamps:
+            return preprocessed
+
+        df_processed, duration = preprocessed
+        return self.resample_time(df_processed), duration
+
+    @timed_stage('preprocess')
+    def clean_data(self, df):
         # Linear Accelerometer: ax, ay, az (m/s2) - to confirm
         # GPS: latitude, longitude, altitude, speed (m/s) - to confirm
         # Gyroscope: wx, wy, wz (rad/s)
@@ -39,7 +153,7 @@ class IRICalculator:
         required_cols = ['time', 'ax', 'ay', 'az' ]
         missing_cols = [col for col in required_cols if col not in df.columns]
         if missing_cols:  # if there's anything here then it's automatically True
-            print(f"Error: Missing required columns: {missing_cols}")
+            logger.error("Missing required columns: %s", missing_cols)
             return None
 
         # Creating a standardized dataframe
@@ -47,48 +161,70 @@ class IRICalculator:
 
         # Handle Time - Convert Iso timestamp format to Unix timestamp format
         if 'time' in df.columns:
-            processed_df['time'] = pd.to_datetime(df['time']).astype('int64')/1e9 # Convert to seconds
-
-            # Subtract each row to the first to start from 0
-            processed_df['time'] = processed_df['time'] - processed_df['time'].iloc[0]
+            # Convert to seconds and subtract each row to the first to start from 0
+            processed_df['time'] = timestamps_to_seconds(df['time'])
 
         else:
-            print("Error: No time column found")
+            logger.error("No time column found")
             return None
 
         # Accelerometer, data is already in correct format - to numeric
-        processed_df['ax'] = pd.to_numeric(df['ax'], errors='coerce')   # errors = 'coerce' converts uncovertable values to NaN (Not a Number)
-        processed_df['ay'] = pd.to_numeric(df['ay'], errors='coerce')
-        processed_df['az'] = pd.to_numeric(df['az'], errors='coerce')
+        # errors = 'coerce' converts uncovertable values to NaN (Not a Number), float columns pass straight through
+        numeric_cols = ['ax', 'ay', 'az']
 
         # GPS data - to numeric
-        if all(col in df.columns for col in ['latitude', 'longitude', 'speed']):
-            processed_df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
-            processed_df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
-            processed_df['speed'] = pd.to_numeric(df['speed'], errors='coerce')
-            processed_df['altitude'] = pd.to_numeric(df['altitude'], errors='coerce') if 'altitude' in df.columns else None
+        has_gps = all(col in df.columns for col in ['latitude', 'longitude', 'speed'])
+        if has_gps:
+            numeric_cols += ['latitude', 'longitude', 'speed']
+            if 'altitude' in df.columns:
+                numeric_cols.append('altitude')
 
         # Gyroscope data(wx, wy, wz) - to numeric
         if all(col in df.columns for col in ['wx', 'wy','wz']):
-            processed_df['wx'] = pd.to_numeric(df['wx'], errors='coerce')
-            processed_df['wy'] = pd.to_numeric(df['wy'], errors='coerce')
-            processed_df['wz'] = pd.to_numeric(df['wz'], errors='coerce')
+            numeric_cols += ['wx', 'wy', 'wz']
 
-        # Remove rows with NaN in time ax ay and az
-        processed_df = processed_df.dropna(subset=['time', 'ax', 'ay', 'az'])
+        numeric = coerce_numeric(df, numeric_cols)
+        for col in numeric_cols:
+            processed_df[col] = numeric[col].values
+        if has_gps and 'altitude' not in df.columns:
+            processed_df['altitude'] = None
 
+        # Remove rows with NaN in time ax ay and az
         # Sort by time - though naturally it's already sorted
-        processed_df = processed_df.sort_values('time').reset_index(drop=True)
+        # Both make a full copy, so only when there is something to drop or reorder
+        valid = processed_df[['time', 'ax', 'ay', 'az']].notna().all(axis=1).values
+        self.timer.record('preprocess', dropped_nan=int(len(valid) - valid.sum()))
+        if not valid.all():
+            processed_df = processed_df[valid].reset_index(drop=True)
+        if not processed_df['time'].is_monotonic_increasing:
+            processed_df = processed_df.sort_values('time').reset_index(drop=True)
 
         # Add duration
         duration = processed_df['time'].iloc[-1] - processed_df['time'].iloc[0]
 
-        print(f"Processed Data: {len(processed_df)} valid rows")
-        print(f"Time range: {processed_df['time'].iloc[0]:.2f}s to {processed_df['time'].iloc[-1]:.2f}s")
-        print(f"Duration: {duration:.2f} seconds")
+        logger.info("Processed Data: %d valid rows, %.2fs to %.2fs (%.2f seconds)", len(processed_df),
+                    processed_df['time'].iloc[0], processed_df['time'].iloc[-1], duration)
 
         return processed_df, duration
 
+    # Preprocessed data on a uniform time grid (see utils/resample.py), so the filter and the orientation
+    # correction see the sampling rate they assume. Time between runs of samples is filled by
+    # interpolation and flagged in a 'gap' column, segments over gaps get no IRI (see segment_stage).
+    @timed_stage('resample_time')
+    def resample_time(self, df, sampling_rate=None):
+        numeric_cols = [col for col in df.columns if col != 'time' and pd.api.types.is_numeric_dtype(df[col])]
+        grid, channels, gap = resample_to_time(df['time'].values, sampling_rate, self.max_gap,
+                                               **{col: df[col].values for col in numeric_cols})
+
+        resampled = pd.DataFrame({'time': grid})
+        for col in df.columns[1:]:
+            resampled[col] = channels[col] if col in channels else None
+        resampled['gap'] = gap
+
+        self.timer.record('resample_time', gap_rows=int(gap.sum()))
+        logger.info("Resampled to %d uniform rows, %d in timestamp gaps", len(resampled), gap.sum())
+        return resampled
+
     # Handling inconsistent column names
     def _find_columns(self, df, possible_names):
 
@@ -103,41 +239,16 @@ class IRICalculator:
                     
         return found_cols
 
+    # Speed between consecutive GPS points, vectorized over the whole track (see utils/geodesy.py)
     def calculate_speed_from_gps(self, df):
-        if 'latitude' not in df.columns or 'longitude' not in df. columns:
+        if 'latitude' not in df.columns or 'longitude' not in df.columns:
             return None
 
-        speeds = []
-        for i in range(len(df)):
-            
-            if i == 0:             # Handling initial position
-                speeds.append(0)
-
-            else:
-                # Distance Calculation between consecutive GPS Points
-                lat1, lon1 = radians(df.iloc[i-1]['latitude']), radians(df.iloc[i-1]['longitude'])
-                lat2, lon2 = radians(df.iloc[i]['latitude']), radians(df.iloc[i]['longitude'])
-
-                # Haversine Formula
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                c = 2*atan2(sqrt(a), sqrt(1-a))
-                distance = 6371000 * c                 # Earth radius in meters
-
-                # Change in time and Speed Calculation
-                dt = df.iloc[i]['time'] - df.iloc[i-1]['time']   # time computation elapsed
-
-                if dt > 0:
-                    speed = distance/dt            # distance over time
-                    speeds.append(speed)           
-                else:
-                    speeds.append(speeds[-1] if speeds else 0)  # reuse the initial and last value
-
-        return np.array(speeds)
+        return speed_from_gps(df['latitude'].values, df['longitude'].values, df['time'].values)
 
     # filters accelerometer data to remove noise and keep only the useful vibration signals
     # estimates sampling rate
+    @timed_stage('filter')
     def filter_accelerometer_data(self, df, cutoff_freq=10, sampling_rate = None):
 
         if sampling_rate is None:
@@ -145,24 +256,35 @@ class IRICalculator:
             time_diff = np.diff(df['time'])             # gets time difference between consecutive rows
             sampling_rate = 1.0/np.median(time_diff)    # 1 / median interval
 
-            print(f"Estimated sampling rate: {sampling_rate:.2f} Hz")
-
-        # Design low-pass filter
-        nyquist = sampling_rate / 2                    # max frequency to capture (half of sample rate)
-        if cutoff_freq >= nyquist:                     # lower  cutoff_freq if too high
-            cutoff_freq = nyquist * 0.9
+            logger.info("Estimated sampling rate: %.2f Hz", sampling_rate)
+        self.timer.record('filter', sampling_rate=sampling_rate)
 
-        b, a = signal.butter(4, cutoff_freq / nyquist, btype = 'low')     # 4th-order Butterworth low-pass filter, allows road bumps, blocks  high frequency noise like phone shake and vibration where b and a are filter coefficients for filtfilt
+        # Design low-pass filter (cached per cutoff and sampling rate)
+        sos = self.design_lowpass_filter(sampling_rate, cutoff_freq)
 
-        # Apply filter
-        df_filtered = df.copy()
-        df_filtered['ax_filtered'] = signal.filtfilt(b, a, df['ax'])
-        df_filtered['ay_filtered'] = signal.filtfilt(b, a, df['ay'])
-        df_filtered['az_filtered'] = signal.filtfilt(b, a, df['az'])
+        # Apply filter to the three axes in one zero-phase pass
+        # df_filtered shares the input columns (shallow copy) and only adds the three filtered ones
+        filtered = zero_phase_filter(sos, df[['ax', 'ay', 'az']].values)
+        df_filtered = df.copy(deep=False)
+        df_filtered['ax_filtered'] = filtered[:, 0]
+        df_filtered['ay_filtered'] = filtered[:, 1]
+        df_filtered['az_filtered'] = filtered[:, 2]
 
         return df_filtered, sampling_rate
 
+    # Low-pass filter design shared by the in-memory and streaming paths, memoized (see utils/filters.py)
+    # 4th-order Butterworth low-pass filter, allows road bumps, blocks  high frequency noise like phone shake and vibration
+    # output='sos' gives second-order sections for sosfiltfilt, output='ba' gives (b, a)
+    def design_lowpass_filter(self, sampling_rate, cutoff_freq=10, output='sos'):
+        return lowpass_design(sampling_rate, cutoff_freq, order=4, output=output)
+
+    # Incremental IRI for blocks of samples arriving during the drive (see utils/streaming.py)
+    def incremental(self, segment_length=100, sampling_rate=None, cutoff_freq=10):
+        from utils.streaming import IncrementalIRI
+        return IncrementalIRI(self, segment_length, sampling_rate, cutoff_freq)
+
     # Extract the vertical acceleration component
+    @timed_stage('orientation')
     def extract_vertical_acceleration(self, df):
 
         # Use Z-axis as this is the vertical movement from the mounting set-up
@@ -182,79 +304,143 @@ class IRICalculator:
         ax, ay , az = df['ax_filtered'].values, df['ay_filtered'].values, df['az_filtered'].values
         wx, wy, wz = df['wx'].values, df['wy'].values, df['wz'].values
 
-        # Simple correction assuming small rotations from visual observations
-        dt = np.median(np.diff(df['time']))
-        angles_x = cumulative_trapezoid(wx, dx=dt, initial = 0)
-        angles_y = cumulative_trapezoid(wy, dx=dt, initial = 0)
+        # Rates integrated over each sample's own time step, small-angle tilt or full attitude
+        return self.orientation_corrector().process(df['time'].values, ax, ay, az, wx, wy, wz)
 
-        # Rotation acceleration vector 
-        vertical_accel = az * np.cos(angles_x) * np.cos(angles_y) + \
-                        ay * np.sin(angles_x) - \
-                        ax * np.sin(angles_y)
-
-        return vertical_accel
+    # Orientation correction with this calculator's settings, process() carries its state between
+    # blocks for the streaming paths (see utils/streaming.py)
+    def orientation_corrector(self, sampling_rate=None):
+        if self.orientation_method not in ORIENTATION_METHODS:
+            raise ValueError(f"Unknown orientation method: {self.orientation_method}")
+        return OrientationCorrector(self.orientation_method, self.gravity_time_constant, sampling_rate)
 
     # Finally, calculation of IRI by RMS method
     # Possible points of improvement: Have a user input how many meters is in a segment
-    def calculate_iri_rms_method(self, df, segment_length=100):     # create IRI values for every 100m
+    # method='quarter_car' uses the quarter-car simulation instead of the RMS model (see IRI_METHODS)
+    def calculate_iri_rms_method(self, df, segment_length=100, method='rms'):     # create IRI values for every 100m
+        stages = self.run_pipeline(df, segment_length, method=method)
+        return stages['iri_values'], stages['segments'], stages['sampling_rate'], stages['speed_estimate']
+
+    # Runs every stage after preprocessing and returns all intermediates, so callers (the calculator
+    # page, plot_results) can reuse the filtered data and vertical acceleration instead of recomputing them
+    # filtered=(df_filtered, sampling_rate) from an earlier filter_accelerometer_data call skips filtering
+    def run_pipeline(self, df, segment_length=100, cutoff_freq=10, method='rms', filtered=None):
+        if method not in IRI_METHODS:
+            raise ValueError(f"Unknown IRI method: {method}")
 
         # Filtered data
-        df_filtered, sampling_rate = self.filter_accelerometer_data(df)
+        if filtered is None:
+            filtered = self.filter_accelerometer_data(df, cutoff_freq)
+        df_filtered, sampling_rate = filtered
 
         # Extract vertical acceleration
         vertical_accel = self.extract_vertical_acceleration(df_filtered)
 
         # Calculate Speed
-        if 'speed' in df_filtered.columns:
-            speed = df_filtered['speed'].values
-        else:
-            speed = self.calculate_speed_from_gps(df_filtered)
-            if speed is None:
-                # Assume constant speed if no GPS data
-                speed = np.full(len(df_filtered), 15.0) # 15 m/s default
-                print("Warning: Using default speed of 15 m/s")
+        speed = self.resolve_speed(df_filtered)
 
         # Remove gravity component and calculate RMS
         vertical_accel_corrected = vertical_accel - np.mean(vertical_accel)
 
         # Calculate distance traveled
-        time_array = df_filtered['time'].values
-        distance = cumulative_trapezoid(speed, time_array, initial = 0)
+        distance = self.calculate_distance(df_filtered['time'].values, speed)
+
+        stages = {
+            'df_filtered': df_filtered,
+            'sampling_rate': sampling_rate,
+            'vertical_accel': vertical_accel,
+            'vertical_accel_corrected': vertical_accel_corrected,
+            'speed': speed,
+            'distance': distance,
+            'iri_method': method
+        }
+
+        # Uniform distance grid, road profile and quarter-car response, computed once and reused by recompute_segments
+        if method == 'quarter_car':
+            stages['grid'] = self.resample_to_distance(vertical_accel_corrected, speed, distance)
+            stages['profile'] = self.quarter_car_profile(stages['grid'])
+
+        stages.update(self.segment_stage(vertical_accel_corrected, speed, distance, segment_length, method, stages.get('profile'),
+                                         gap_mask(df_filtered)))
+
+        if self.metrics_file:
+            self.timer.export(self.metrics_file, segment_length=segment_length, iri_method=method)
+
+        return stages
+
+    # New segment length or IRI method on an existing run_pipeline result: keeps the filtered vertical
+    # acceleration and distance, and only re-runs segmentation and IRI per segment (plus the profile the
+    # grid and profile the first time the quarter-car method is asked for)
+    def recompute_segments(self, stages, segment_length, method=None):
+        updated = dict(stages)
+        updated['iri_method'] = method = method or stages.get('iri_method', 'rms')
+        if method not in IRI_METHODS:
+            raise ValueError(f"Unknown IRI method: {method}")
+
+        if method == 'quarter_car' and updated.get('profile') is None:
+            updated['grid'] = self.resample_to_distance(stages['vertical_accel_corrected'], stages['speed'], stages['distance'])
+            updated['profile'] = self.quarter_car_profile(updated['grid'])
+
+        updated.update(self.segment_stage(stages['vertical_accel_corrected'], stages['speed'], stages['distance'], segment_length,
+                                          method, updated.get('profile'), gap_mask(stages['df_filtered'])))
+
+        if self.metrics_file:
+            self.timer.export(self.metrics_file, segment_length=segment_length, iri_method=method)
+
+        return updated
+
+    # Segmentation and IRI per segment from the vertical acceleration and distance stages
+    # The quarter-car method needs the profile from quarter_car_profile
+    # gap: per-sample mask of timestamp gaps (see resample_time), segments over a gap get a NaN IRI
+    def segment_stage(self, vertical_accel_corrected, speed, distance, segment_length, method='rms', profile=None, gap=None):
 
         # Segmentation of data
         segments = self._create_segments(distance, vertical_accel_corrected, speed, segment_length)
 
-        # Calculation of IRI for each segment
-        iri_values = []
-        for segment in segments:
-            iri, speed = self._calculate_segment_iri(segment)
-            iri_values.append(iri)
+        # Calculation of IRI for all segments at once
+        segment_results = self.calculate_segment_iri_batch(vertical_accel_corrected, speed, segments.start_index, segments.end_index)
+        if method == 'quarter_car':
+            segment_results['iri_value'] = self.calculate_segment_iri_quarter_car(profile, segments)
+        iri_values = segment_results['iri_value'].values
+        if gap is not None:
+            iri_values = np.where(segments_with_gaps(gap, segments.start_index, segments.end_index), np.nan, iri_values)
+        segments.set_results(iri_values, segment_results['mean_speed'].values, segment_results['rms_accel'].values)
+
+        # Mean speed of the last segment, as reported by the per-segment loop before
+        speed_estimate = segment_results['mean_speed'].iloc[-1] if len(segment_results) else speed
+
+        return {
+            'segments': segments,
+            'iri_values': iri_values,
+            'speed_estimate': speed_estimate
+        }
+
+    # Speed from the GPS speed column, GPS positions or a default
+    @timed_stage('distance')
+    def resolve_speed(self, df):
+        if 'speed' in df.columns:
+            return df['speed'].values
+
+        speed = self.calculate_speed_from_gps(df)
+        if speed is None:
+            # Assume constant speed if no GPS data
+            speed = np.full(len(df), 15.0) # 15 m/s default
+            logger.warning("No GPS speed or positions, using default speed of 15 m/s")
+
+        return speed
 
-        return iri_values, segments, sampling_rate, speed
+    # Distance traveled, integrating speed over time
+    @timed_stage('distance')
+    def calculate_distance(self, time_array, speed):
+        from scipy.integrate import cumulative_trapezoid
+        return cumulative_trapezoid(speed, time_array, initial = 0)
 
     #Create Segments of specified length
+    # Returns a SegmentTable holding offsets into the shared arrays (see utils/segmentation.py)
+    @timed_stage('segmentation')
     def _create_segments(self, distance, vertical_accel, speed, segment_length):
-        segments = []
-        max_distance = distance[-1]
-
-        for start_dist in np.arange(0, max_distance - segment_length, segment_length):
-            end_dist = start_dist + segment_length
-
-            # Find indices for this segment
-            start_idx = np.argmin(np.abs(distance - start_dist))
-            end_idx = np.argmin(np.abs(distance - end_dist))
-
-            if end_idx > start_idx:
-                segment = {
-                    'distance_start': start_dist,
-                    'distance_end': end_dist,
-                    'vertical_accel': vertical_accel [start_idx: end_idx],
-                    'speed' : speed[start_idx:end_idx],
-                    'length' : segment_length,
-                    'center_index': start_idx + (end_idx - start_idx) // 2
-                }
-                segments.append(segment)
-
+        segments = SegmentTable.from_distance(distance, vertical_accel, speed, segment_length)
+        self.timer.record('segmentation', segments=len(segments))
         return segments
     
 
@@ -266,98 +452,122 @@ class IRICalculator:
         # Calculate RMS acceleration
         rms_accel = np.sqrt(np.mean(vertical_accel**2))
 
-        # Convert to IRI with empirical relationship
-        # IRI = K * (RMS_accel)^n / speed^m
-        # Values below are approximate coefficients and needs calibration
-
-        K = 80.59 # Calibration constant
-        n = 1  # Acceleration exponent
-        m = 1 # Speed Exponent
-
-        if mean_speed > 0:
-            iri = K*(rms_accel**n) / (mean_speed**m)
+        iri = self._iri_from_rms(rms_accel, mean_speed)
+
+        return float(iri), mean_speed
+
+    # Computation of IRI for all segments at once from their start/end offsets
+    # Returns one row per segment instead of a list of dicts
+    @timed_stage('iri')
+    def calculate_segment_iri_batch(self, vertical_accel, speed, start_idx, end_idx):
+        mean_speed = segment_means(speed, start_idx, end_idx)
+        rms_accel = np.sqrt(segment_means(np.square(vertical_accel), start_idx, end_idx))
+
+        return pd.DataFrame({
+            'start_index': start_idx,
+            'end_index': end_idx,
+            'rms_accel': rms_accel,
+            'mean_speed': mean_speed,
+            'iri_value': self._iri_from_rms(rms_accel, mean_speed)
+        })
+
+    # Vertical acceleration and speed interpolated on a uniform distance grid (see utils/resample.py)
+    # Returns a dict of grid 'distance' (m), 'vertical_accel', 'speed' and the grid 'spacing'
+    @timed_stage('resample')
+    def resample_to_distance(self, vertical_accel, speed, distance, spacing=GRID_SPACING):
+        grid_distance, channels = resample_to_distance(distance, spacing, vertical_accel=vertical_accel, speed=speed)
+        return dict(channels, distance=grid_distance, spacing=spacing)
+
+    # Longitudinal profile on the distance grid and the quarter-car response over it
+    # Returns a dict of grid 'distance' (m) and 'spacing', profile 'slope' and rectified quarter-car 'response'
+    @timed_stage('profile')
+    def quarter_car_profile(self, grid):
+        slope = reconstruct_profile(grid['vertical_accel'], grid['speed'], grid['spacing'])
+        return {
+            'distance': grid['distance'],
+            'spacing': grid['spacing'],
+            'slope': slope,
+            'response': quarter_car_response(slope, grid['spacing'])
+        }
+
+    # IRI of every segment from the quarter-car response over its distance range
+    @timed_stage('iri')
+    def calculate_segment_iri_quarter_car(self, profile, segments):
+        return segment_iri(profile['distance'], profile['response'], segments.distance_start, segments.length, profile['spacing'])
+
+    # Convert to IRI with empirical relationship, zero where the vehicle is not moving
+    def _iri_from_rms(self, rms_accel, mean_speed):
+        rms_accel = np.asarray(rms_accel, dtype=float)
+        mean_speed = np.asarray(mean_speed, dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            iri = self.calibration_k * (rms_accel**self.accel_exponent) / (mean_speed**self.speed_exponent)
+
+        return np.where(mean_speed > 0, iri, 0.0)
+
+    # Map points for the segments: coordinates of each segment's center sample, or with average=True
+    # the mean coordinates of all its samples, plus IRI and quality class. Segments whose center
+    # falls outside df are left out.
+    def segment_map_points(self, df, iri_values, segments, average=False):
+        if 'latitude' not in df.columns or 'longitude' not in df.columns:
+            return pd.DataFrame(columns=['Latitude', 'Longitude', 'IRI', 'Quality'])
+
+        latitude = df['latitude'].values.astype(float)
+        longitude = df['longitude'].values.astype(float)
+        iri_values = np.asarray(iri_values, dtype=float)[:len(segments)]
+
+        # Segments without an IRI (NaN) are left off the map
+        center = segments.center_index
+        inside = (center >= 0) & (center < len(df)) & ~np.isnan(iri_values)
+
+        if average:
+            start, end = segments.start_index[inside], np.minimum(segments.end_index[inside], len(df))
+            lat = segment_means(latitude, start, end, skipna=True)
+            lon = segment_means(longitude, start, end, skipna=True)
         else:
-            iri = 0 
+            lat = latitude[center[inside]]
+            lon = longitude[center[inside]]
 
-        return iri, mean_speed
+        return pd.DataFrame({
+            'Latitude': lat,
+            'Longitude': lon,
+            'IRI': iri_values[inside],
+            'Quality': classify_iri(iri_values[inside])
+        })
 
     # Plotting the Results
-    def plot_results(self, df, iri_values, segments):
-        
-        fig, axes = plt.subplots(3,1, figsize = (12, 10))
-
-        # Plotting raw accelerometer data
-        axes[0].plot(df['time'], df['ax'], label='X-axis', alpha = 0.7)
-        axes[0].plot(df['time'], df['ay'], label='Y-axis', alpha = 0.7)
-        axes[0].plot(df['time'], df['az'], label='Z-axis', alpha = 0.7)
-        axes[0].set_ylabel('Acceleration (m/s^2)')
-        axes[0].set_title('Raw Accelerometer Data')
-        axes[0].legend()
-        axes[0].grid(True)
-
-        # Plot filtered vertical acceleration
-        df_filtered, _ = self.filter_accelerometer_data(df)
-        vertical_accel = self.extract_vertical_acceleration(df_filtered)
-        axes[1].plot(df_filtered['time'], vertical_accel)
-        axes[1].set_ylabel('Vertical Acceleration (m/s^2)')
-        axes[1].set_title('Filtered Vertical Acceleration')
-        axes[1].grid(True)
-
-        # Plot IRI values
-        segment_centers = [s['distance_start'] + s['length']/2 for s in segments]
-        axes[2].plot(segment_centers, iri_values, 'ro-')
-        axes[2].set_xlabel('Distance (m)')
-        axes[2].set_ylabel('IRI (m/km)')
-        axes[2].set_title('International Roughness Index')
-        axes[2].grid(True)
-
-        plt.tight_layout()
-        plt.show()
+    # stages from run_pipeline are reused when given instead of filtering again
+    # Signal traces are cut to max_points per line keeping peaks (see utils/downsample.py), None draws every sample
+    # matplotlib is only imported here (see utils/plotting.py)
+    def plot_results(self, df, iri_values, segments, stages=None, max_points=DEFAULT_MAX_POINTS):
+        from utils.plotting import plot_results
+        return plot_results(self, df, iri_values, segments, stages, max_points)
 
     # Plotting Raw Data
-    def plot_raw_data(self, df):
-        fig, axes = plt.subplots(2,1, figsize = (12,8))
-
-        # Plot raw accelerometer data
-        axes[0].plot(df['time'], df['ax'], label='X-axis', alpha=0.7)
-        axes[0].plot(df['time'], df['ay'], label='Y-axis', alpha=0.7)
-        axes[0].plot(df['time'], df['az'], label='Z-axis', alpha=0.7)
-        axes[0].set_ylabel('Acceleration (m/s^2)')
-        axes[0].set_title('Raw Accelerometer Data')
-        axes[0].legend()
-        axes[0].grid(True)
-
-        # Plot speed if available
-        if 'speed' in df.columns:
-            axes[1].plot(df['time'], df['speed'])
-            axes[1].set_ylabel('Speed (m/s)')
-            axes[1].set_title('Vehicle Speed')
-            axes[1].grid(True)
-
-        axes[1].set_xlabel('Time (seconds)')
-        plt.tight_layout()
-        plt.show()
-
-        return fig
+    def plot_raw_data(self, df, max_points=DEFAULT_MAX_POINTS):
+        from utils.plotting import plot_raw_data
+        return plot_raw_data(df, max_points)
+
+    # Processed survey and IRI results as a Parquet/Feather archive directory (see utils/archive.py)
+    # Loading it back skips CSV parsing and preprocessing, recompute_segments works on the loaded stages
+    def save_archive(self, stages, df_processed, duration, directory, format='parquet'):
+        from utils.archive import export_result
+        export_result({'stages': stages, 'df_processed': df_processed, 'duration': duration}, directory, format)
+        logger.info("Archive saved to %s", directory)
+        return directory
+
+    # Returns (stages, df_processed, duration) of an archive written by save_archive
+    def load_archive(self, directory, memory_map=False):
+        from utils.archive import import_result
+        result = import_result(directory, memory_map)
+        return result['stages'], result['df_processed'], result['duration']
 
     # Saving the Results
     def save_results(self, iri_values, segments, filename = 'iri_results.csv'):
 
-        results = []
-        for i, (iri, segment) in enumerate(zip(iri_values, segments)):
-            results.append({
-                'segment_id' : i + 1,
-                'distance_start' : segment['distance_start'],
-                'distance_end' : segment['distance_end'],
-                'segment_length' : segment['length'],
-                'iri_value' : iri, 
-                'mean_speed' : np.mean(segment['speed']),
-                'rms_accel' : np.sqrt(np.mean(segment['vertical_accel']**2))
-            })
-
-        results_df = pd.DataFrame(results)
+        results_df = segments.to_frame(iri_values)
         results_df.to_csv(filename, index = False)
-        print(f"Results saved to {filename}")
+        logger.info("Results saved to %s", filename)
 
         return results_df
         
@@ -0,0 +1,169 @@
+import numpy as np
+
+
+# Phone orientation correction: vertical acceleration from the accelerometer and gyroscope axes
+# 'small_angle' tilts by the integrated wx, wy (roll and pitch) and ignores their coupling, fine for a
+# phone held steady in a mount. 'quaternion' propagates the full attitude from wx, wy, wz.
+ORIENTATION_METHODS = {
+    'small_angle': 'Small-angle tilt from the integrated roll and pitch rates',
+    'quaternion': 'Full attitude from quaternion propagation'
+}
+
+IDENTITY_QUATERNION = np.array([1.0, 0.0, 0.0, 0.0])
+
+# Quaternions scanned per block by the parallel-prefix product (see quaternion_cumprod)
+SCAN_BLOCK = 64
+
+
+# Hamilton product p * q of quaternions stored as (..., 4) arrays of (w, x, y, z)
+def quaternion_multiply(p, q):
+    pw, px, py, pz = np.moveaxis(p, -1, 0)
+    qw, qx, qy, qz = np.moveaxis(q, -1, 0)
+    return np.stack([
+        pw * qw - px * qx - py * qy - pz * qz,
+        pw * qx + px * qw + py * qz - pz * qy,
+        pw * qy - px * qz + py * qw + pz * qx,
+        pw * qz + px * qy - py * qx + pz * qw
+    ], axis=-1)
+
+
+# Running product q[0] * q[1] * ... * q[k] for every k, without a loop over samples
+# Quaternion products are associative, so the running product is a parallel-prefix scan: a doubling
+# (Hillis-Steele) scan inside blocks of SCAN_BLOCK, the same scan over the block totals, then each block
+# is prefixed by the product of the blocks before it. About log2(SCAN_BLOCK) passes over the data.
+def quaternion_cumprod(q):
+    q = np.asarray(q, dtype=float)
+    n = len(q)
+    if n <= SCAN_BLOCK:
+        return _scan_block(q)
+
+    pad = (-n) % SCAN_BLOCK
+    blocks = np.concatenate([q, np.broadcast_to(IDENTITY_QUATERNION, (pad, 4))]).reshape(-1, SCAN_BLOCK, 4)
+    blocks = _scan_block(blocks)
+
+    carry = quaternion_cumprod(blocks[:, -1])
+    blocks[1:] = quaternion_multiply(carry[:-1, None, :], blocks[1:])
+    return blocks.reshape(-1, 4)[:n]
+
+
+def _scan_block(q):
+    q = q.copy()
+    step = 1
+    while step < q.shape[-2]:
+        q[..., step:, :] = quaternion_multiply(q[..., :-step, :], q[..., step:, :])
+        step *= 2
+    return q
+
+
+# Trapezoid increments of a rate over each sample interval, using every sample's own dt
+# prev=(time, value) of the sample before the first one continues an earlier block, otherwise the
+# first increment is 0
+def rate_increments(rate, time, prev=None):
+    rate = np.asarray(rate, dtype=float)
+    time = np.asarray(time, dtype=float)
+    prev_time, prev_rate = (time[:1], rate[:1]) if prev is None else (np.atleast_1d(prev[0]), np.atleast_1d(prev[1]))
+
+    dt = np.diff(time, prepend=prev_time)
+    return 0.5 * (rate + np.concatenate([prev_rate, rate[:-1]])) * dt
+
+
+# Body-frame rotation quaternion of every sample interval from the gyroscope rates (rad/s)
+def rotation_increments(wx, wy, wz, time, prev=None):
+    theta = np.stack([rate_increments(w, time, None if prev is None else (prev[0], prev[i + 1]))
+                      for i, w in enumerate([wx, wy, wz])], axis=-1)
+    angle = np.sqrt(np.einsum('ij,ij->i', theta, theta))
+
+    # sin(angle/2)/angle, written with sinc so a zero rotation gives the identity
+    scale = 0.5 * np.sinc(angle / (2 * np.pi))
+    return np.column_stack([np.cos(angle / 2), theta * scale[:, None]])
+
+
+# Reference vertical axis in phone coordinates for every attitude quaternion (phone to reference frame),
+# the third row of the rotation matrix, so vertical acceleration = (ax, ay, az) . axis
+def vertical_axis(attitude):
+    w, x, y, z = attitude.T
+    return np.column_stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)])
+
+
+# Vertical acceleration corrected for the phone orientation, for a whole survey or block by block
+# Each process() call continues from the previous one (time, angles, attitude and filter state), so
+# chunks of a survey give the result of processing it in one go.
+# gravity_time_constant (s) turns on a complementary filter: the gyroscope attitude is trusted over
+# short times and pulled towards the direction of the measured acceleration over longer ones, which
+# stops gyroscope drift on long drives. It needs accelerometer data that includes gravity.
+# sampling_rate sets the filter coefficient, estimated from the first block when not given.
+class OrientationCorrector:
+
+    def __init__(self, method='small_angle', gravity_time_constant=None, sampling_rate=None):
+        if method not in ORIENTATION_METHODS:
+            raise ValueError(f"Unknown orientation method: {method}")
+
+        self.method = method
+        self.gravity_time_constant = gravity_time_constant
+        self.sampling_rate = sampling_rate
+        self._prev = None                   # (time, wx, wy, wz) of the last sample processed
+        self._angles = np.zeros(2)          # small-angle roll and pitch so far
+        self._attitude = IDENTITY_QUATERNION
+        self._zi = None                     # complementary filter state, one per axis
+
+    def process(self, time, ax, ay, az, wx, wy, wz):
+        if len(time) == 0:
+            return np.empty(0)
+
+        time = np.asarray(time, dtype=float)
+        if self.method == 'quaternion':
+            axis = self._quaternion_axis(time, wx, wy, wz)
+        else:
+            axis = self._small_angle_axis(time, wx, wy)
+        self._prev = (time[-1], wx[-1], wy[-1], wz[-1])
+
+        accel = np.column_stack([ax, ay, az])
+        if self.gravity_time_constant is not None:
+            axis = self._gravity_filter(axis, accel, time)
+
+        return np.einsum('ij,ij->i', accel, axis)
+
+    # Roll and pitch integrated with the trapezoid rule, the tilted axis keeps the small-angle form
+    # az*cos(x)*cos(y) + ay*sin(x) - ax*sin(y)
+    def _small_angle_axis(self, time, wx, wy):
+        angles = [carry + np.cumsum(rate_increments(w, time, None if self._prev is None else (self._prev[0], self._prev[i + 1])))
+                  for i, (carry, w) in enumerate(zip(self._angles, [wx, wy]))]
+        self._angles = np.array([angles[0][-1], angles[1][-1]])
+
+        angles_x, angles_y = angles
+        return np.column_stack([-np.sin(angles_y), np.sin(angles_x), np.cos(angles_x) * np.cos(angles_y)])
+
+    def _quaternion_axis(self, time, wx, wy, wz):
+        increments = rotation_increments(wx, wy, wz, time, self._prev)
+        increments[0] = quaternion_multiply(self._attitude, increments[0])
+        attitude = quaternion_cumprod(increments)
+
+        # Keep unit length, rounding in the products adds up over millions of samples
+        attitude /= np.linalg.norm(attitude, axis=1, keepdims=True)
+        self._attitude = attitude[-1]
+        return vertical_axis(attitude)
+
+    # First-order complementary filter on the vertical axis: axis + lowpass(measured - axis), run as
+    # one IIR pass per axis with lfilter
+    def _gravity_filter(self, axis, accel, time):
+        from scipy.signal import lfilter
+
+        if self.sampling_rate is None:
+            self.sampling_rate = 1.0 / np.median(np.diff(time)) if len(time) > 1 else 1.0
+        alpha = self.gravity_time_constant / (self.gravity_time_constant + 1.0 / self.sampling_rate)
+        b, a = [1 - alpha], [1, -alpha]
+
+        norm = np.linalg.norm(accel, axis=1, keepdims=True)
+        measured = np.divide(accel, norm, out=axis.copy(), where=norm > 0)
+        if self._zi is None:
+            self._zi = np.zeros((1, 3))
+
+        correction, self._zi = lfilter(b, a, measured - axis, axis=0, zi=self._zi)
+        corrected = axis + correction
+        return corrected / np.linalg.norm(corrected, axis=1, keepdims=True)
+
+
+# Vertical acceleration of a whole survey (see OrientationCorrector)
+def vertical_acceleration(time, ax, ay, az, wx, wy, wz, method='small_angle', gravity_time_constant=None):
+    corrector = OrientationCorrector(method, gravity_time_constant)
+    return corrector.process(time, ax, ay, az, wx, wy, wz)
@@ -0,0 +1,14 @@
+import functools
+import os
+
+
+STYLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'styles')
+
+
+# <style> block of a page's stylesheet (styles/<name>.css), read from disk once per process
+# Streamlit rebuilds the page on every rerun, so the block is still sent each time, only the
+# file read and string building are shared between reruns and sessions
+@functools.lru_cache(maxsize=None)
+def page_css(name):
+    with open(os.path.join(STYLES_DIR, name + '.css'), encoding='utf-8') as fh:
+        return f"<style>\n{fh.read()}</style>"
@@ -0,0 +1,76 @@
+import matplotlib.pyplot as plt
+
+from utils.downsample import DEFAULT_MAX_POINTS, downsample_trace
+
+
+# Matplotlib figures of a calculation, kept out of utils/iri_calculator.py so importing the
+# calculator (the Streamlit pages, batch workers) does not load matplotlib
+
+
+# Plotting the Results
+# calculator (an IRICalculator) filters df when stages is not given
+# stages from run_pipeline are reused when given instead of filtering again
+# Signal traces are cut to max_points per line keeping peaks (see utils/downsample.py), None draws every sample
+def plot_results(calculator, df, iri_values, segments, stages=None, max_points=DEFAULT_MAX_POINTS):
+
+    fig, axes = plt.subplots(3,1, figsize = (12, 10))
+
+    # Plotting raw accelerometer data
+    axes[0].plot(*downsample_trace(df['time'], df['ax'], max_points), label='X-axis', alpha = 0.7)
+    axes[0].plot(*downsample_trace(df['time'], df['ay'], max_points), label='Y-axis', alpha = 0.7)
+    axes[0].plot(*downsample_trace(df['time'], df['az'], max_points), label='Z-axis', alpha = 0.7)
+    axes[0].set_ylabel('Acceleration (m/s^2)')
+    axes[0].set_title('Raw Accelerometer Data')
+    axes[0].legend()
+    axes[0].grid(True)
+
+    # Plot filtered vertical acceleration
+    if stages is None:
+        df_filtered, _ = calculator.filter_accelerometer_data(df)
+        vertical_accel = calculator.extract_vertical_acceleration(df_filtered)
+    else:
+        df_filtered, vertical_accel = stages['df_filtered'], stages['vertical_accel']
+    axes[1].plot(*downsample_trace(df_filtered['time'], vertical_accel, max_points))
+    axes[1].set_ylabel('Vertical Acceleration (m/s^2)')
+    axes[1].set_title('Filtered Vertical Acceleration')
+    axes[1].grid(True)
+
+    # Plot IRI values
+    segment_centers = segments.segment_centers
+    axes[2].plot(segment_centers, iri_values, 'ro-')
+    axes[2].set_xlabel('Distance (m)')
+    axes[2].set_ylabel('IRI (m/km)')
+    axes[2].set_title('International Roughness Index')
+    axes[2].grid(True)
+
+    plt.tight_layout()
+    plt.show()
+
+    return fig
+
+
+# Plotting Raw Data
+def plot_raw_data(df, max_points=DEFAULT_MAX_POINTS):
+    fig, axes = plt.subplots(2,1, figsize = (12,8))
+
+    # Plot raw accelerometer data
+    axes[0].plot(*downsample_trace(df['time'], df['ax'], max_points), label='X-axis', alpha=0.7)
+    axes[0].plot(*downsample_trace(df['time'], df['ay'], max_points), label='Y-axis', alpha=0.7)
+    axes[0].plot(*downsample_trace(df['time'], df['az'], max_points), label='Z-axis', alpha=0.7)
+    axes[0].set_ylabel('Acceleration (m/s^2)')
+    axes[0].set_title('Raw Accelerometer Data')
+    axes[0].legend()
+    axes[0].grid(True)
+
+    # Plot speed if available
+    if 'speed' in df.columns:
+        axes[1].plot(*downsample_trace(df['time'], df['speed'], max_points))
+        axes[1].set_ylabel('Speed (m/s)')
+        axes[1].set_title('Vehicle Speed')
+        axes[1].grid(True)
+
+    axes[1].set_xlabel('Time (seconds)')
+    plt.tight_layout()
+    plt.show()
+
+    return fig
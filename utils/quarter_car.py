@@ -0,0 +1,123 @@
+from functools import lru_cache
+
+import numpy as np
+
+from utils.filters import highpass_design
+from utils.resample import GRID_SPACING, grid_segment_means
+from utils.segmentation import segment_means
+
+
+# Golden Car quarter-car parameters of the IRI reference model (per unit sprung mass)
+GOLDEN_CAR = {
+    'k1': 653.0,        # tire spring rate
+    'k2': 63.3,         # suspension spring rate
+    'c': 6.0,           # suspension damping rate
+    'mu': 0.15          # unsprung / sprung mass ratio
+}
+REFERENCE_SPEED = 80 / 3.6      # the IRI is defined at 80 km/h (m/s)
+BASE_LENGTH = 0.25              # profile smoothing base length of the IRI definition (m)
+
+MIN_PROFILE_SPEED = 1.0         # slower samples are left out of the profile (m/s)
+LONG_WAVELENGTH = 60.0          # longer wavelengths are integration drift, not road profile (m)
+
+
+# Longitudinal profile slope from vertical acceleration and speed on a uniform distance grid
+# (see utils/resample.py). Along the road the profile curvature is a / v^2, integrated once to slope.
+# Wavelengths beyond long_wavelength are removed after each step, that is where accelerometer bias
+# and integration drift end up. Points slower than min_speed get no curvature since a / v^2 is
+# meaningless there. The elevation is np.cumsum(slope) * spacing.
+def reconstruct_profile(vertical_accel, speed, spacing=GRID_SPACING,
+                        min_speed=MIN_PROFILE_SPEED, long_wavelength=LONG_WAVELENGTH):
+    vertical_accel = np.asarray(vertical_accel, dtype=float)
+    speed = np.asarray(speed, dtype=float)
+    if len(vertical_accel) < 2:
+        return np.zeros(len(vertical_accel))
+
+    moving = speed >= min_speed
+    curvature = np.zeros(len(vertical_accel))
+    curvature[moving] = vertical_accel[moving] / speed[moving]**2
+
+    # Cycles per meter: one sample every `spacing` meters, cut-off at 1 / long_wavelength
+    sos = highpass_design(1 / spacing, 1 / long_wavelength)
+    curvature = _zero_phase(sos, curvature)
+    return _zero_phase(sos, np.cumsum(curvature) * spacing)
+
+
+# Rectified slope |z_s - z_u| of the Golden Car driven over a profile slope sampled every `spacing`
+# meters at 80 km/h, the quantity the IRI averages. The whole profile is filtered in one sosfilt call
+# through the discretized state-space model, starting at rest.
+def quarter_car_response(slope, spacing=GRID_SPACING):
+    slope = np.asarray(slope, dtype=float)
+
+    # Profile smoothing with a moving average over the 250 mm base length
+    width = int(round(BASE_LENGTH / spacing))
+    if width > 1:
+        slope = np.convolve(slope, np.ones(width) / width, mode='same')
+
+    from scipy import signal
+    return np.abs(signal.sosfilt(quarter_car_sos(spacing), slope))
+
+
+# IRI (m/km) of every segment starting at distance_start, averaging the quarter-car response over the
+# grid points inside it. When the segment length is a whole number of grid steps this is one reshape
+# and mean, otherwise each range is looked up on the grid. Segments without grid points get NaN.
+def segment_iri(grid_distance, response, distance_start, segment_length, spacing=GRID_SPACING):
+    distance_start = np.asarray(distance_start, dtype=float)
+    iri = np.full(len(distance_start), np.nan)
+    if len(grid_distance) == 0:
+        return iri
+
+    offset = (distance_start - grid_distance[0]) / segment_length
+    rows = np.rint(offset).astype(np.intp)
+    points = segment_length / spacing
+
+    if np.isclose(points, round(points)) and np.allclose(offset, rows):
+        means = grid_segment_means(response, segment_length, spacing) * 1000
+        filled = (rows >= 0) & (rows < len(means))
+        iri[filled] = means[rows[filled]]
+        return iri
+
+    start = np.searchsorted(grid_distance, distance_start, side='left')
+    end = np.searchsorted(grid_distance, distance_start + segment_length, side='left')
+    filled = end > start
+    iri[filled] = segment_means(response, start[filled], end[filled]) * 1000
+    return iri
+
+
+# Second-order sections of the Golden Car from profile slope to suspension stroke z_s - z_u
+# States are [z_s, z_s', z_u, z_u'], discretized with a zero-order hold over one profile step
+# (spacing / 80 km/h). Memoized since the spacing rarely changes, callers get a copy.
+def quarter_car_sos(spacing=GRID_SPACING):
+    return _quarter_car_sos(float(spacing)).copy()
+
+
+@lru_cache(maxsize=8)
+def _quarter_car_sos(spacing):
+    from scipy import signal
+    from scipy.linalg import expm
+
+    k1, k2, c, mu = GOLDEN_CAR['k1'], GOLDEN_CAR['k2'], GOLDEN_CAR['c'], GOLDEN_CAR['mu']
+
+    a = np.array([
+        [0, 1, 0, 0],
+        [-k2, -c, k2, c],
+        [0, 0, 0, 1],
+        [k2/mu, c/mu, -(k1 + k2)/mu, -c/mu]
+    ])
+    b = np.array([[0], [0], [0], [k1/mu]])
+    output = np.array([[1, 0, -1, 0]])
+
+    # Zero-order hold: x[k+1] = ST x[k] + PR u[k], the output is read after each update
+    st = expm(a * spacing / REFERENCE_SPEED)
+    pr = np.linalg.solve(a, (st - np.eye(4)) @ b)
+
+    zeros, poles, gain = signal.ss2zpk(st, pr, output @ st, output @ pr)
+    return signal.zpk2sos(zeros, poles, gain)
+
+
+def _zero_phase(sos, data):
+    if len(data) <= 3 * (2 * len(sos) + 1):
+        return data - np.mean(data)
+
+    from scipy import signal
+    return signal.sosfiltfilt(sos, data)
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+GRID_SPACING = 0.25             # distance between grid points (m)
+
+
+# Channels sampled in time put on a uniform distance grid, one point every `spacing` meters from the
+# first sample's distance. Samples where the distance does not advance (vehicle stopped) are skipped,
+# they cover no road. Returns (grid_distance, {name: values on the grid}).
+def resample_to_distance(distance, spacing=GRID_SPACING, **channels):
+    distance = np.asarray(distance, dtype=float)
+    grid = np.arange(distance[0], distance[-1], spacing) if len(distance) else np.zeros(0)
+
+    advancing = np.empty(len(distance), dtype=bool)
+    advancing[:1] = True
+    advancing[1:] = np.diff(distance) > 0
+
+    resampled = {}
+    for name, values in channels.items():
+        values = np.broadcast_to(np.asarray(values, dtype=float), distance.shape)
+        resampled[name] = np.interp(grid, distance[advancing], values[advancing])
+
+    return grid, resampled
+
+
+# Grid points per segment, segment_length must be a whole number of grid steps
+def points_per_segment(segment_length, spacing=GRID_SPACING):
+    points = int(round(segment_length / spacing))
+    if points < 1 or not np.isclose(points * spacing, segment_length):
+        raise ValueError(f"Segment length {segment_length} m is not a multiple of the {spacing} m grid spacing")
+    return points
+
+
+# Grid values as one row per complete segment (a view, no copy), the partial last segment is left out
+def grid_segments(values, segment_length, spacing=GRID_SPACING):
+    points = points_per_segment(segment_length, spacing)
+    count = len(values) // points
+    return np.asarray(values)[:count * points].reshape(count, points)
+
+
+# Mean of every complete segment in one axis reduction
+def grid_segment_means(values, segment_length, spacing=GRID_SPACING):
+    return grid_segments(values, segment_length, spacing).mean(axis=1)
+
+
+# Intervals longer than GAP_FACTOR times the sampling interval are gaps (dropped or delayed samples)
+GAP_FACTOR = 5.0
+
+
+# Channels with irregular timestamps put on uniform time grids, ready for the Butterworth filter
+# Samples are split into contiguous runs at every interval longer than max_gap (GAP_FACTOR sampling
+# intervals by default), each run gets its own grid from its first sample at 1/sampling_rate steps
+# (1/median interval by default), continued to the next run so the time between runs is filled.
+# Channels are interpolated linearly, across gaps too, and grid points inside gaps are flagged in the
+# gap mask so segments over them can be left out (see segments_with_gaps).
+# Linear in the number of samples, channels are resampled one at a time.
+# Returns (grid_time, {name: values on the grid}, gap mask).
+def resample_to_time(time, sampling_rate=None, max_gap=None, **channels):
+    time = np.asarray(time, dtype=float)
+    if len(time) < 2:
+        resampled = {name: np.array(values, dtype=float) for name, values in channels.items()}
+        return time.copy(), resampled, np.zeros(len(time), dtype=bool)
+
+    if sampling_rate is None:
+        sampling_rate = 1.0 / np.median(np.diff(time))
+    if max_gap is None:
+        max_gap = GAP_FACTOR / sampling_rate
+
+    # First and last sample of every run
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(time) > max_gap) + 1])
+    ends = np.append(starts[1:] - 1, len(time) - 1)
+    run_start = time[starts]
+
+    # Grid points per run: up to the next run's first sample, the last run up to its last sample
+    counts = np.empty(len(starts), dtype=np.int64)
+    counts[:-1] = np.ceil(np.diff(run_start) * sampling_rate - 1e-9)
+    counts[-1] = np.floor((time[-1] - run_start[-1]) * sampling_rate + 1e-9) + 1
+
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid = np.repeat(run_start, counts) + step / sampling_rate
+    gap = grid > np.repeat(time[ends], counts)
+
+    resampled = {}
+    for name, values in channels.items():
+        resampled[name] = np.interp(grid, time, np.asarray(values, dtype=float))
+
+    return grid, resampled, gap
+
+
+# Segments holding at least one gap sample, from prefix counts of the mask
+# start_index/end_index as in SegmentTable (end exclusive)
+def segments_with_gaps(gap, start_index, end_index):
+    counts = np.concatenate([[0], np.cumsum(gap, dtype=np.int64)])
+    return counts[end_index] - counts[start_index] > 0
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+import numpy as np
+
+from utils.segmentation import SegmentTable
+
+
+DEFAULT_CACHE_DIR = os.environ.get('IRI_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'iri-system'))
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024      # 1 GB of cached results before the oldest are evicted
+
+# Arrays of the distance grid and quarter-car profile stages (run_pipeline with method='quarter_car')
+GRID_ARRAYS = ('distance', 'vertical_accel', 'speed')
+PROFILE_ARRAYS = ('slope', 'response')
+
+
+# On-disk cache of calculation results, shared by every session on the machine
+# Entries are keyed by a hash of the uploaded file bytes plus the calculator parameters and stored
+# as uncompressed .npz files (raw float arrays, no pickling). The least recently used entries are
+# removed once the directory grows past max_bytes.
+class ResultCache:
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    # Cache key for a file's contents and the parameters it is processed with
+    @staticmethod
+    def key(file_bytes, params):
+        digest = hashlib.sha256(file_bytes)
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    # Cached result for a key, or None
+    # A missing entry (including one another session evicts while it is read) or an unreadable one
+    # (partially written, corrupt) is a cache miss
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                result = unpack_result(data)
+            os.utime(path)              # mark as recently used
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        return result
+
+    def save(self, key, result):
+        fd, tmp_path = tempfile.mkstemp(suffix='.npz', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez(fh, **pack_result(result))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    # Remove least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, name))
+
+
+# Flatten a calculator page result (processed data + run_pipeline stages) into named arrays
+def pack_result(result):
+    stages = result['stages']
+    df_processed = result['df_processed']
+    segments = stages['segments']
+
+    processed_cols = [col for col in df_processed.columns if pd.api.types.is_numeric_dtype(df_processed[col])]
+    filtered_cols = [col for col in stages['df_filtered'].columns if col.endswith('_filtered')]
+
+    arrays = {'processed__' + col: df_processed[col].values for col in processed_cols}
+    arrays.update({'filtered__' + col: stages['df_filtered'][col].values for col in filtered_cols})
+    arrays.update({
+        'vertical_accel': stages['vertical_accel'],
+        'speed': np.asarray(stages['speed'], dtype=float),
+        'distance': stages['distance'],
+        'segment_distance_start': segments.distance_start,
+        'segment_start_index': segments.start_index,
+        'segment_end_index': segments.end_index,
+        'segment_iri': stages['iri_values'],
+        'segment_mean_speed': segments.mean_speed,
+        'segment_rms_accel': segments.rms_accel,
+    })
+    grid, profile = stages.get('grid'), stages.get('profile')
+    if profile is not None:
+        arrays.update({'grid__' + name: grid[name] for name in GRID_ARRAYS})
+        arrays.update({'profile__' + name: profile[name] for name in PROFILE_ARRAYS})
+
+    meta = {
+        'processed_cols': processed_cols,
+        'filtered_cols': filtered_cols,
+        'sampling_rate': float(stages['sampling_rate']),
+        'speed_estimate': float(np.mean(stages['speed_estimate'])),
+        'segment_length': segments.length,
+        'iri_method': stages.get('iri_method', 'rms'),
+        'grid_spacing': None if profile is None else float(profile['spacing']),
+        'duration': float(result['duration'])
+    }
+    arrays['meta'] = np.array(json.dumps(meta))
+
+    return arrays
+
+
+# Rebuild the result pack_result flattened
+def unpack_result(data):
+    meta = json.loads(str(data['meta']))
+
+    # copy=False keeps the columns as the arrays passed in (memory maps when read from an archive)
+    # and both frames share the processed columns
+    processed = {col: data['processed__' + col] for col in meta['processed_cols']}
+    filtered = {col: data['filtered__' + col] for col in meta['filtered_cols']}
+    df_processed = pd.DataFrame(processed, copy=False)
+    df_filtered = pd.DataFrame({**processed, **filtered}, copy=False)
+
+    vertical_accel = data['vertical_accel']
+    vertical_accel_corrected = vertical_accel - np.mean(vertical_accel)
+    speed = data['speed']
+    iri_values = data['segment_iri']
+
+    segments = SegmentTable(data['segment_distance_start'], data['segment_start_index'], data['segment_end_index'],
+                            meta['segment_length'], vertical_accel_corrected, speed, iri_value=iri_values,
+                            mean_speed=data['segment_mean_speed'], rms_accel=data['segment_rms_accel'])
+
+    stages = {
+        'df_filtered': df_filtered,
+        'sampling_rate': meta['sampling_rate'],
+        'vertical_accel': vertical_accel,
+        'vertical_accel_corrected': vertical_accel_corrected,
+        'speed': speed,
+        'distance': data['distance'],
+        'segments': segments,
+        'iri_values': iri_values,
+        'speed_estimate': meta['speed_estimate'],
+        'iri_method': meta.get('iri_method', 'rms')
+    }
+    if meta.get('grid_spacing') is not None:
+        stages['grid'] = {name: data['grid__' + name] for name in GRID_ARRAYS}
+        stages['grid']['spacing'] = meta['grid_spacing']
+        stages['profile'] = {name: data['profile__' + name] for name in PROFILE_ARRAYS}
+        stages['profile'].update(distance=stages['grid']['distance'], spacing=meta['grid_spacing'])
+
+    return {
+        'stages': stages,
+        'duration': meta['duration'],
+        'df_processed': df_processed
+    }
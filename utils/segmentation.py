@@ -0,0 +1,232 @@
+import pandas as pd
+import numpy as np
+
+
+# Index of the sample nearest to each target distance
+# Same result as np.argmin(np.abs(distance - target)) per target, including picking the
+# first index on ties, but in O(log n) per target when distance is monotonic
+def nearest_indices(distance, targets):
+    distance = np.asarray(distance)
+    targets = np.asarray(targets, dtype=float)
+
+    if len(distance) == 0:
+        raise ValueError("distance array is empty")
+    if len(distance) == 1:
+        return np.zeros(len(targets), dtype=np.intp)
+
+    if not _is_sorted(distance):
+        # Fall back to a full scan per target (e.g. negative speeds make distance go backwards)
+        return np.array([np.argmin(np.abs(distance - x)) for x in targets], dtype=np.intp)
+
+    # First sample at or beyond each target, and the sample just before it
+    right = np.searchsorted(distance, targets, side='left')
+    right = np.clip(right, 1, len(distance) - 1)
+    left = right - 1
+
+    left_gap = np.abs(distance[left] - targets)
+    right_gap = np.abs(distance[right] - targets)
+
+    # argmin returns the first occurrence of a repeated distance value (vehicle stopped)
+    left = np.searchsorted(distance, distance[left], side='left')
+    right = np.searchsorted(distance, distance[right], side='left')
+
+    return np.where(left_gap <= right_gap, left, right).astype(np.intp)
+
+
+# Segment boundaries for a cumulative distance array, built in one pass
+# Returns (distance_start, start_idx, end_idx) arrays, keeping only non-empty segments
+def segment_boundaries(distance, segment_length):
+    distance = np.asarray(distance)
+    max_distance = distance[-1]
+
+    distance_start = np.arange(0, max_distance - segment_length, segment_length)
+    edges = nearest_indices(distance, np.append(distance_start, distance_start + segment_length))
+
+    start_idx = edges[:len(distance_start)]
+    end_idx = edges[len(distance_start):]
+
+    keep = end_idx > start_idx
+    return distance_start[keep], start_idx[keep], end_idx[keep]
+
+
+# Middle sample of each segment
+def center_indices(start_idx, end_idx):
+    return start_idx + (end_idx - start_idx) // 2
+
+
+# Checked in blocks so memory-mapped distance arrays are not pulled into memory at once
+def _is_sorted(values, block=1_000_000):
+    for start in range(0, len(values) - 1, block):
+        chunk = np.asarray(values[start:start + block + 1])
+        if not np.all(chunk[1:] >= chunk[:-1]):
+            return False
+    return True
+
+
+# Sum of values[start:end] for every segment in one np.add.reduceat call
+# Segments must be non-empty (end > start), which segment_boundaries guarantees
+def segment_sums(values, start_idx, end_idx):
+    values = np.asarray(values, dtype=float)
+    if len(start_idx) == 0:
+        return np.zeros(0)
+
+    # reduceat sums between consecutive offsets, so interleave starts and ends and keep every other sum
+    offsets = np.empty(2*len(start_idx), dtype=np.intp)
+    offsets[0::2] = start_idx
+    offsets[1::2] = end_idx
+    if offsets[-1] >= len(values):
+        values = np.append(values, 0.0)
+
+    return np.add.reduceat(values, offsets)[0::2]
+
+
+# Mean of values[start:end] for every segment, skipna=True ignores NaN samples (NaN if all are)
+def segment_means(values, start_idx, end_idx, skipna=False):
+    if not skipna:
+        return segment_sums(values, start_idx, end_idx) / (np.asarray(end_idx) - np.asarray(start_idx))
+
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    counts = segment_sums(~missing, start_idx, end_idx)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return segment_sums(np.where(missing, 0.0, values), start_idx, end_idx) / np.where(counts > 0, counts, np.nan)
+
+
+# Array-backed table of segments
+# Stores only start/end offsets into the shared signal arrays plus per-segment scalars.
+# Indexing or iterating gives SegmentView rows that behave like the old segment dicts,
+# slicing 'vertical_accel' and 'speed' out of the shared arrays only when asked for.
+class SegmentTable:
+
+    __slots__ = ('distance_start', 'start_index', 'end_index', 'length',
+                 'vertical_accel', 'speed', 'iri_value', '_mean_speed', '_rms_accel')
+
+    def __init__(self, distance_start, start_index, end_index, length, vertical_accel, speed,
+                 iri_value=None, mean_speed=None, rms_accel=None):
+        self.distance_start = np.asarray(distance_start, dtype=float)
+        self.start_index = np.asarray(start_index, dtype=np.intp)
+        self.end_index = np.asarray(end_index, dtype=np.intp)
+        self.length = length
+        self.vertical_accel = vertical_accel
+        self.speed = speed
+        self.iri_value = None if iri_value is None else np.asarray(iri_value, dtype=float)
+        self._mean_speed = mean_speed
+        self._rms_accel = rms_accel
+
+    # Segments of a cumulative distance array, see segment_boundaries
+    @classmethod
+    def from_distance(cls, distance, vertical_accel, speed, segment_length):
+        distance_start, start_idx, end_idx = segment_boundaries(distance, segment_length)
+        return cls(distance_start, start_idx, end_idx, segment_length, vertical_accel, speed)
+
+    @property
+    def distance_end(self):
+        return self.distance_start + self.length
+
+    @property
+    def center_index(self):
+        return center_indices(self.start_index, self.end_index)
+
+    @property
+    def segment_centers(self):
+        return self.distance_start + self.length/2
+
+    @property
+    def sample_count(self):
+        return self.end_index - self.start_index
+
+    @property
+    def mean_speed(self):
+        if self._mean_speed is None:
+            self._mean_speed = segment_means(self.speed, self.start_index, self.end_index)
+        return self._mean_speed
+
+    @property
+    def rms_accel(self):
+        if self._rms_accel is None:
+            self._rms_accel = np.sqrt(segment_means(np.square(self.vertical_accel), self.start_index, self.end_index))
+        return self._rms_accel
+
+    # Attach per-segment results computed elsewhere (e.g. the batched IRI)
+    def set_results(self, iri_value, mean_speed=None, rms_accel=None):
+        self.iri_value = np.asarray(iri_value, dtype=float)
+        if mean_speed is not None:
+            self._mean_speed = np.asarray(mean_speed, dtype=float)
+        if rms_accel is not None:
+            self._rms_accel = np.asarray(rms_accel, dtype=float)
+
+    def __len__(self):
+        return len(self.start_index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield SegmentView(self, i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SegmentTable(
+                self.distance_start[key], self.start_index[key], self.end_index[key], self.length,
+                self.vertical_accel, self.speed,
+                iri_value=None if self.iri_value is None else self.iri_value[key],
+                mean_speed=None if self._mean_speed is None else self._mean_speed[key],
+                rms_accel=None if self._rms_accel is None else self._rms_accel[key]
+            )
+
+        i = range(len(self))[key]          # handles negative indices and raises IndexError
+        return SegmentView(self, i)
+
+    # One row per segment, the same columns as save_results writes
+    def to_frame(self, iri_values=None):
+        if iri_values is None:
+            iri_values = self.iri_value if self.iri_value is not None else np.full(len(self), np.nan)
+
+        return pd.DataFrame({
+            'segment_id': np.arange(1, len(self) + 1),
+            'distance_start': self.distance_start,
+            'distance_end': self.distance_end,
+            'segment_length': np.full(len(self), self.length),
+            'iri_value': np.asarray(iri_values, dtype=float)[:len(self)],
+            'mean_speed': self.mean_speed,
+            'rms_accel': self.rms_accel
+        })
+
+
+# A single row of a SegmentTable, read like the old segment dict
+class SegmentView:
+
+    __slots__ = ('_table', '_i')
+
+    _FIELDS = ('distance_start', 'distance_end', 'vertical_accel', 'speed', 'length', 'center_index')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, key):
+        table, i = self._table, self._i
+        if key == 'distance_start':
+            return table.distance_start[i]
+        if key == 'distance_end':
+            return table.distance_start[i] + table.length
+        if key == 'length':
+            return table.length
+        if key == 'center_index':
+            start, end = table.start_index[i], table.end_index[i]
+            return int(start + (end - start) // 2)
+        if key == 'vertical_accel':
+            return table.vertical_accel[table.start_index[i]:table.end_index[i]]
+        if key == 'speed':
+            return table.speed[table.start_index[i]:table.end_index[i]]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._FIELDS
+
+    def get(self, key, default=None):
+        return self[key] if key in self._FIELDS else default
+
+    def keys(self):
+        return list(self._FIELDS)
+
+    def to_dict(self):
+        return {key: self[key] for key in self._FIELDS}
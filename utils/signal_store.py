@@ -0,0 +1,164 @@
+import os
+import tempfile
+
+import pandas as pd
+import numpy as np
+
+
+# Channels that keep float64 whatever the store dtype: float32 would cost about 1 ms of time after
+# 3 hours, centimeters of distance and about a meter of GPS position
+FULL_PRECISION_CHANNELS = ('time', 'distance', 'latitude', 'longitude')
+
+
+# Per-sample signal channels held once, each as its own contiguous array
+# dtype=np.float32 halves the memory of the sensor channels (FULL_PRECISION_CHANNELS stay float64).
+# memmap=True backs every channel with a file in `directory` (a temporary directory by default,
+# removed on close), so idle sessions are paged out by the OS instead of holding RAM.
+# frame() and the arrays are views, pipeline stages and DataFrames share them without copying.
+class SignalStore:
+
+    def __init__(self, dtype=np.float64, memmap=False, directory=None):
+        self.dtype = np.dtype(dtype)
+        self.memmap = memmap or directory is not None
+        self.channels = {}
+        self._tmp = None
+        self._files = {}
+        self._lengths = {}
+
+        if self.memmap and directory is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix='iri_signals_', ignore_cleanup_errors=True)
+            directory = self._tmp.name
+        self.directory = directory
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.channels
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def __len__(self):
+        return len(self.channels)
+
+    def keys(self):
+        return self.channels.keys()
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.channels.values())
+
+    def dtype_for(self, name):
+        return np.dtype(np.float64) if name in FULL_PRECISION_CHANNELS else self.dtype
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + '.bin')
+
+    # Empty channel of `length` samples to be filled in place
+    def create(self, name, length):
+        if self.memmap:
+            values = np.memmap(self._path(name), dtype=self.dtype_for(name), mode='w+', shape=(length,))
+        else:
+            values = np.empty(length, dtype=self.dtype_for(name))
+        self.channels[name] = values
+        return values
+
+    # Store a copy of values as a channel, returns the stored array
+    def add(self, name, values):
+        values = np.asarray(values)
+        stored = self.create(name, len(values))
+        stored[:] = values
+        return stored
+
+    # Channels written a chunk at a time (memory-mapped stores only), readable after finish()
+    def append(self, name, values):
+        if not self.memmap:
+            raise ValueError("append needs a memory-mapped store")
+        if name not in self._files:
+            self._files[name] = open(self._path(name), 'wb')
+            self._lengths[name] = 0
+        np.ascontiguousarray(values, dtype=self.dtype_for(name)).tofile(self._files[name])
+        self._lengths[name] += len(values)
+
+    def finish(self):
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
+
+        for name, length in self._lengths.items():
+            if length:
+                self.channels[name] = np.memmap(self._path(name), dtype=self.dtype_for(name), mode='r+', shape=(length,))
+        self._lengths = {}
+        return self.channels
+
+    # DataFrame over the given channels (all by default) without copying them
+    def frame(self, names=None):
+        names = list(self.channels) if names is None else names
+        return pd.DataFrame({name: self.channels[name] for name in names}, copy=False)
+
+    def close(self):
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
+        self.channels = {}
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+
+
+# Calculator page result (see IRICalculator.run_pipeline) with every per-sample signal held once in a
+# SignalStore. df_processed and df_filtered become views of the same channels instead of two full
+# copies, as do the vertical acceleration, speed and distance stages. The store is kept under
+# result['signals'] so memory-mapped files live as long as the result.
+def store_result(result, dtype=np.float32, memmap=False, directory=None):
+    stages = result['stages']
+    df_processed = result['df_processed']
+    df_filtered = stages['df_filtered']
+    store = SignalStore(dtype, memmap, directory)
+
+    processed_cols = [col for col in df_processed.columns if pd.api.types.is_numeric_dtype(df_processed[col])]
+    filtered_cols = [col for col in df_filtered.columns if col.endswith('_filtered')]
+    for col in processed_cols:
+        store.add(col, df_processed[col].values)
+    for col in filtered_cols:
+        store.add(col, df_filtered[col].values)
+
+    # The resolved speed is usually the GPS speed column itself
+    speed = stages['speed']
+    if 'speed' in store and np.ndim(speed) and (np.shares_memory(speed, df_filtered['speed'].values)
+                                                 or np.array_equal(speed, df_processed['speed'].values)):
+        speed_name = 'speed'
+    else:
+        speed_name = 'vehicle_speed'
+        store.add(speed_name, np.broadcast_to(speed, len(df_processed)))
+
+    store.add('vertical_accel', stages['vertical_accel'])
+    store.add('vertical_accel_corrected', stages['vertical_accel_corrected'])
+    store.add('distance', stages['distance'])
+
+    # Columns that are not numbers (e.g. an all-empty altitude) are kept as they are
+    stored_processed = pd.DataFrame({col: store[col] if col in processed_cols else df_processed[col].values
+                                     for col in df_processed.columns}, copy=False)
+
+    # Segments slice the shared arrays, point them at the stored ones
+    segments = stages['segments'][:]
+    segments.vertical_accel = store['vertical_accel_corrected']
+    segments.speed = store[speed_name]
+
+    updated = dict(stages)
+    updated.update({
+        'df_filtered': store.frame(processed_cols + filtered_cols),
+        'vertical_accel': store['vertical_accel'],
+        'vertical_accel_corrected': store['vertical_accel_corrected'],
+        'speed': store[speed_name],
+        'distance': store['distance'],
+        'segments': segments
+    })
+
+    stored = dict(result)
+    stored.update(stages=updated, df_processed=stored_processed, signals=store)
+    return stored